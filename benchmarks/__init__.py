@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Micro-benchmarks.
+
+Each module can be run with `python -m benchmarks.<module>` from the root of
+the repository and uses the configuration of the server (see `loc/__init__.py`).
+"""
+
+import timeit
+
+
+def measure(name, func, number=10000, repeat=5):
+    """Time a function and print the best result.
+
+    Args:
+        name (str): Name shown in the results.
+        func (callable): Function to time (without arguments).
+        number (int): Calls per repetition.
+        repeat (int): Number of repetitions.
+
+    Returns:
+        Best time per call, in microseconds.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    per_call = best / number * 1e6
+
+    print('%-40s %10.2f us/call' % (name, per_call))
+
+    return per_call
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Response encoding.
+
+Compares `flask.jsonify()` with the `JSONEncoder` backends when encoding
+large leaderboard pages and constant error responses.
+
+    python -m benchmarks.encoding
+"""
+
+from flask import jsonify
+from loc import app
+from loc.helper import messages as m, util
+from loc.helper.encoding import JSONEncoder, orjson
+
+from benchmarks import measure
+
+import datetime
+
+
+def leaderboard_page(parties=1000, members=4):
+    """Build a leaderboard page like the one of `/v1/matches/leaderboard`."""
+    response = []
+
+    for position in range(1, parties + 1):
+        response.append({
+            'position': position,
+            'leader': 'user%d' % position,
+            'members': ['user%d-%d' % (position, i) for i in range(members)],
+            'delete-date': datetime.datetime(2017, 10, 1, 10, 0, 0)
+        })
+
+    return util.paginated(1, response)
+
+
+def encoder(backend):
+    """Create an encoder with the given backend."""
+    app.config['JSON_ENCODER'] = backend
+
+    return JSONEncoder(app)
+
+
+if __name__ == '__main__':
+    ctx = app.test_request_context()
+    ctx.push()
+
+    backends = ['stdlib']
+    if orjson is not None:
+        backends.append('orjson')
+
+    for size in (100, 1000):
+        page = {'status': 'success', 'data': leaderboard_page(size)}
+
+        print('leaderboard, %d parties' % size)
+        measure('  jsonify', lambda: jsonify(**page), 100)
+
+        for backend in backends:
+            e = encoder(backend)
+            measure('  ' + backend, lambda: e.response(page), 100)
+
+    print('constant error')
+    measure('  jsonify', lambda: jsonify(status='error', message=m.MATCH_NOT_FOUND), 2000)
+    measure('  api_error', lambda: util.api_error(m.MATCH_NOT_FOUND), 2000)
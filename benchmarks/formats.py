@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Response formats.
+
+Compares the size and encoding time of large leaderboard pages in JSON and in
+the binary formats that clients may request (MessagePack and CBOR), both
+uncompressed and compressed with gzip.
+
+    python -m benchmarks.formats
+"""
+
+from loc import app
+from loc.helper.encoding import (
+    CBORBackend,
+    MsgpackBackend,
+    OrjsonBackend,
+    StdlibBackend,
+    cbor2,
+    msgpack,
+    orjson
+)
+
+from benchmarks import measure
+from benchmarks.encoding import leaderboard_page
+
+import gzip
+
+
+if __name__ == '__main__':
+    ctx = app.test_request_context()
+    ctx.push()
+
+    backends = [('json (stdlib)', StdlibBackend())]
+
+    if orjson is not None:
+        backends.append(('json (orjson)', OrjsonBackend()))
+
+    if msgpack is not None:
+        backends.append(('msgpack', MsgpackBackend()))
+
+    if cbor2 is not None:
+        backends.append(('cbor', CBORBackend()))
+
+    for size in (100, 1000):
+        page = {'status': 'success', 'data': leaderboard_page(size)}
+
+        print('leaderboard, %d parties' % size)
+
+        for name, backend in backends:
+            body = backend.dumps(page)
+            compressed = gzip.compress(body, 6)
+
+            measure('  ' + name, lambda: backend.dumps(page), 100)
+            print('  %-40s %10d bytes, %d gzip' % (
+                name + ' size', len(body), len(compressed)
+            ))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Lookup queries.
+
+Compares building the frequent lookups (match by slug, user by username,
+email or ID, role by name) with `filter_by()` on every call, as the models
+did, with the baked queries of `loc.models`, which are compiled once and
+only bind their parameters. Both run against a temporary (in-memory) SQLite
+database, so the difference is the CPU saved per call.
+
+    python -m benchmarks.lookups
+"""
+
+from loc import app, db
+from loc.models import Match, Role, User
+
+from benchmarks import measure
+from benchmarks.queries import seed
+
+
+if __name__ == '__main__':
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+
+    ctx = app.test_request_context()
+    ctx.push()
+
+    db.create_all()
+    seed(1)
+
+    lookups = [
+        (
+            'match by slug',
+            lambda: Match.query.filter_by(
+                slug='board',
+                is_visible=True,
+                is_deleted=False
+            ).first(),
+            lambda: Match._by_slug('board')
+        ),
+        (
+            'user by username',
+            lambda: User.query.filter_by(
+                username='user0',
+                is_deleted=False
+            ).first(),
+            lambda: User._by_username('user0')
+        ),
+        (
+            'user by email',
+            lambda: User.query.filter_by(
+                email='user0@test.com',
+                is_deleted=False
+            ).first(),
+            lambda: User._by_email('user0@test.com')
+        ),
+        (
+            'user by id (auth)',
+            lambda: User.query.filter_by(id=1, is_deleted=False).first(),
+            lambda: User._by_id(1)
+        ),
+        (
+            'role by name',
+            lambda: Role.query.filter_by(name='admin').first(),
+            lambda: Role.get_role('admin')
+        ),
+    ]
+
+    for name, built, baked in lookups:
+        print(name)
+        measure('  filter_by', built, 2000)
+        measure('  baked', baked, 2000)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Request parameter validation.
+
+Compares the `with_params()` schemas with the `check_required()` and
+`check_optional()` decorator chain they replaced, for a small and a large set
+of parameters, received both in a JSON body and in the query string. The old
+decorators are no longer used by the views, so a copy of them is kept here.
+
+    python -m benchmarks.params
+"""
+
+from flask import g
+from functools import wraps
+from loc import app
+from loc.helper import util
+from loc.helper import messages as m
+from loc.helper.deco import with_params
+from loc.helper.schema import Param
+
+from benchmarks import measure
+
+import datetime
+
+
+SMALL = {'match': 'some-match', 'page': 2}
+
+LARGE = {
+    'match': 'some-match',
+    'title': 'Some match',
+    'short-description': 'Short description',
+    'long-description': 'Long description',
+    'start-date': '2017-10-01 10:00:00',
+    'end-date': '2017-10-08 10:00:00',
+    'min-members': 1,
+    'max-members': 4,
+    'leaderboard': False,
+    'is-visible': True,
+}
+
+
+# Old decorators (as they were before being replaced by `with_params()`)
+def _check_type(params, name, p_type):
+    """Check the data type of a request parameter.
+
+    Parameters received in the query string are converted to the expected
+    type (in place).
+
+    Args:
+        params (dict): Request parameters.
+        name (str): Name of the parameter.
+        p_type (type): Expected data type.
+
+    Returns:
+        `True` if the parameter is valid, otherwise `False`.
+    """
+    if name in g.query_params:
+        try:
+            params[name] = util.parse_query_value(params[name], p_type)
+
+        except ValueError:
+            return False
+
+        g.query_params.discard(name)
+
+    return isinstance(params[name], p_type)
+
+def check_required(params):
+    """Check that the specified parameters are provided and valid.
+
+    Parameters can be received in the JSON body or, for GET requests, in the
+    query string.
+
+    Args:
+        params (list[tuple]): List of tuples containing the parameter name
+            and the data type that the parameter should be.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            json = util.request_params()
+
+            # Check if parameters were provided
+            if not json:
+                response = {}
+                for p in params:
+                    response[p[0]] = m.FIELD_MISSING
+
+                return util.api_fail(**response), 400
+
+            # Check for missing fields and wrong data types
+            errors = {}
+            for p in params:
+                name = p[0]
+                p_type = p[1]
+
+                # Missing field
+                if name not in json.keys():
+                    errors[name] = m.FIELD_MISSING
+                    continue
+
+                # Wrong data type
+                if not _check_type(json, name, p_type):
+                    errors[name] = m.INVALID_TYPE
+
+            # Return errors if any
+            if errors:
+                return util.api_fail(**errors), 400
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+def check_optional(params):
+    """Check that the specified parameters are valid.
+
+    This is for optional parameters that may not appear in the request, so
+    they will only be checked if present.
+
+    Args:
+        params (list[tuple]): List of tuples containing the parameter name
+            and the data type that the parameter should be.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            json = util.request_params()
+
+            # Check if parameters were provided
+            if not json:
+                # Nothing to do
+                return f(*args, **kwargs)
+
+            # Check for missing fields and wrong data types
+            errors = {}
+            for p in params:
+                name = p[0]
+                p_type = p[1]
+
+                # Missing field, skip it
+                if name not in json.keys():
+                    continue
+
+                # Wrong data type
+                if not _check_type(json, name, p_type):
+                    errors[name] = m.INVALID_TYPE
+
+            # Return errors if any
+            if errors:
+                return util.api_fail(**errors), 400
+
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+# Small set of parameters: old chain
+@check_required([('match', str)])
+@check_optional([('page', int)])
+def small_chain():
+    received = util.request_params()
+
+    return received.get('match'), received.get('page', 1)
+
+# Small set of parameters: schema
+@with_params(
+    Param('match', str),
+    Param('page', int, default=1),
+)
+def small_schema(params):
+    return params.match, params.page
+
+
+# Large set of parameters: old chain (dates parsed by hand)
+@check_required([('match', str)])
+@check_optional([
+    ('title', str),
+    ('short-description', str),
+    ('long-description', str),
+    ('start-date', str),
+    ('end-date', str),
+    ('min-members', int),
+    ('max-members', int),
+    ('leaderboard', bool),
+    ('is-visible', bool),
+    ('slug', str)
+])
+def large_chain():
+    received = util.request_params()
+    data = {name: received.get(name) for name in LARGE}
+
+    for name in ('start-date', 'end-date'):
+        data[name] = datetime.datetime.strptime(
+            data[name],
+            '%Y-%m-%d %H:%M:%S'
+        )
+
+    return data
+
+# Large set of parameters: schema
+@with_params(
+    Param('match', str),
+    Param('title', str, default=None),
+    Param('short-description', str, default=None),
+    Param('long-description', str, default=None),
+    Param('start-date', datetime.datetime, default=None),
+    Param('end-date', datetime.datetime, default=None),
+    Param('min-members', int, default=None),
+    Param('max-members', int, default=None),
+    Param('leaderboard', bool, default=None),
+    Param('is-visible', bool, default=None),
+    Param('slug', str, default=None),
+)
+def large_schema(params):
+    return params
+
+
+def run_view(view, **context):
+    """Create a function that calls the view within a request context.
+
+    The context is created once; the parameters cached in `flask.g` are
+    dropped before each call so that they are parsed and validated again.
+    """
+    ctx = app.test_request_context(**context)
+    ctx.push()
+
+    def run():
+        g.pop('params', None)
+        view()
+
+    return run
+
+
+if __name__ == '__main__':
+    query = lambda d: {k: str(v) for k, v in d.items()}
+
+    cases = (
+        ('small, json', {'json': SMALL}, small_chain, small_schema),
+        ('small, query', {'query_string': query(SMALL)}, small_chain, small_schema),
+        ('large, json', {'json': LARGE}, large_chain, large_schema),
+        ('large, query', {'query_string': query(LARGE)}, large_chain, large_schema),
+    )
+
+    for name, context, chain, schema in cases:
+        old = measure(name + ' (chain)', run_view(chain, **context), 2000)
+        new = measure(name + ' (schema)', run_view(schema, **context), 2000)
+
+        print('%-40s %10.2fx' % ('  speedup', old / new))
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Query counts and budgets.
+
+Requests the read endpoints with pages of different sizes, in a temporary
+(in-memory) SQLite database, and fails if:
+    - a view exceeds its query budget (see `loc.helper.deco.query_budget()`).
+    - the number of statements of an endpoint grows with the size of the
+      page (N+1 queries).
+    - a `GET` view of the API does not declare a budget.
+
+    python -m benchmarks.queries
+"""
+
+from loc import app, count_cache, db, query_stats, response_cache
+from loc.helper import auth
+from loc.helper.instrumentation import QueryBudgetExceeded
+from loc.models import Follower, Match, MatchParticipant, Party, Role, User
+
+import datetime
+import sys
+
+
+# Endpoints checked, as (URL, parameters)
+ENDPOINTS = [
+    ('/v1/account/profile', {}),
+    ('/v1/account/followers', {}),
+    ('/v1/account/following', {}),
+    ('/v1/admin/deleted-matches', {'with-total': 'true'}),
+    ('/v1/admin/users', {'with-total': 'true'}),
+    ('/v1/admin/deleted-users', {'with-total': 'true'}),
+    ('/v1/admin/match-leaderboard', {'match': 'board', 'with-total': 'true'}),
+    ('/v1/matches/list', {'with-total': 'true'}),
+    ('/v1/matches/list-past', {'with-total': 'true'}),
+    ('/v1/matches/info', {'match': 'board'}),
+    ('/v1/matches/leaderboard', {'match': 'board', 'with-total': 'true'}),
+    ('/v1/matches/participants', {'match': 'board', 'with-total': 'true'}),
+    ('/v1/matches/lfg', {'match': 'board', 'with-total': 'true'}),
+    ('/v1/parties/list', {'with-total': 'true'}),
+    ('/v1/parties/list-past', {'with-total': 'true'}),
+    ('/v1/users/profile', {'user': 'user0'}),
+    ('/v1/users/followers', {'user': 'user0'}),
+    ('/v1/users/following', {'user': 'user0'}),
+    ('/v1/users/matches', {'user': 'user0', 'with-total': 'true'}),
+    ('/v1/users/past-matches', {'user': 'user0', 'with-total': 'true'}),
+]
+
+# Page sizes compared
+PAGE_SIZES = (1, 5, 20)
+
+
+def _match(slug, start_date, end_date, **kwargs):
+    """Create a match."""
+    match = Match(
+        title=slug,
+        short_description=slug,
+        long_description=slug,
+        start_date=start_date,
+        end_date=end_date,
+        min_members=1,
+        max_members=3,
+        slug=slug,
+        is_visible=True,
+        **kwargs
+    )
+    db.session.add(match)
+    db.session.flush()
+
+    return match
+
+def seed(entries):
+    """Populate the database and obtain an access token.
+
+    The (admin) user is in a party of three members in `entries` running and
+    `entries` past matches, and follows (and is followed by) `entries` users
+    whose parties compete in the `board` match. There are also `entries`
+    deleted users and matches.
+
+    Args:
+        entries (int): Number of records of each kind.
+
+    Returns:
+        Access token of the user.
+    """
+    admin = Role(name='admin')
+    db.session.add(admin)
+
+    users = [
+        User(username='user%d' % i, email='user%d@test.com' % i, password='-')
+        for i in range(3)
+    ]
+    players = [
+        User(username='player%d' % i, email='player%d@test.com' % i, password='-')
+        for i in range(entries)
+    ]
+    db.session.add_all(users + players)
+    db.session.add_all(
+        User(
+            username='deleted%d' % i,
+            email='deleted%d@test.com' % i,
+            password='-',
+            is_deleted=True
+        )
+        for i in range(entries)
+    )
+    db.session.flush()
+
+    users[0].roles.add(admin)
+
+    now = datetime.datetime.utcnow()
+    week = datetime.timedelta(days=7)
+
+    for i in range(entries * 2):
+        end_date = now + (week if i % 2 else -week)
+        match = _match(
+            'match-%d' % i,
+            end_date - week - datetime.timedelta(hours=i),
+            end_date
+        )
+
+        db.session.add(Party(
+            owner_id=users[0].id,
+            match_id=match.id,
+            token='token-%d' % i
+        ))
+
+        for user in users:
+            db.session.add(MatchParticipant(
+                user_id=user.id,
+                match_id=match.id,
+                party_owner_id=users[0].id
+            ))
+
+    for i in range(entries):
+        _match('deleted-%d' % i, now, now + week, is_deleted=True)
+
+    board = _match('board', now - week, now + week, leaderboard=True)
+
+    for i, player in enumerate(players):
+        db.session.add(Party(
+            owner_id=player.id,
+            match_id=board.id,
+            token='board-%d' % i,
+            is_public=True,
+            is_participating=True,
+            position=i + 1
+        ))
+        db.session.add(MatchParticipant(
+            user_id=player.id,
+            match_id=board.id,
+            party_owner_id=player.id
+        ))
+        db.session.add(Follower(follower_id=player.id, followee_id=users[0].id))
+        db.session.add(Follower(follower_id=users[0].id, followee_id=player.id))
+
+    db.session.commit()
+
+    return auth.issue_access_token(users[0])
+
+
+if __name__ == '__main__':
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['TESTING'] = True
+    query_stats.headers = True
+    query_stats.strict = True
+
+    with app.test_request_context():
+        db.create_all()
+        token = seed(max(PAGE_SIZES))
+
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    failed = False
+
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions[rule.endpoint]
+
+        if (rule.rule.startswith('/v1/')
+                and 'GET' in rule.methods
+                and getattr(view, 'query_budget', None) is None):
+            print('%s: no query budget' % rule.rule)
+            failed = True
+
+    for url, params in ENDPOINTS:
+        counts = []
+
+        for size in PAGE_SIZES:
+            for setting in ('MATCHES_PER_PAGE', 'PARTIES_PER_PAGE',
+                            'USERS_PER_PAGE'):
+                app.config[setting] = size
+
+            response_cache.clear()
+            count_cache.clear()
+
+            try:
+                response = client.get(
+                    url,
+                    headers=headers,
+                    query_string=params
+                )
+
+            except QueryBudgetExceeded as e:
+                print(e)
+                failed = True
+                break
+
+            if response.status_code != 200:
+                print('%s: status %d' % (url, response.status_code))
+                failed = True
+
+            counts.append(int(response.headers['X-Query-Count']))
+
+        if len(set(counts)) > 1:
+            print('%s: depends on the page size' % url)
+            failed = True
+
+        print('%-40s %s' % (
+            url,
+            ', '.join(
+                '%d queries (%d items)' % (c, s)
+                for c, s in zip(counts, PAGE_SIZES)
+            )
+        ))
+
+    sys.exit(1 if failed else 0)
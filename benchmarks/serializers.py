@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Serializers.
+
+Compares building match items from ORM instances (as list endpoints did)
+with the serializer of `loc.helper.serializers` on row tuples, for a page of
+matches.
+
+    python -m benchmarks.serializers
+"""
+
+from loc import app
+from loc.helper import serializers
+from loc.models import Match
+
+from benchmarks import measure
+
+import datetime
+
+
+def orm_items(matches):
+    """Build the items from ORM instances."""
+    response = []
+
+    for match in matches:
+        item = {
+            'title': match.title,
+            'start-date': match.start_date.isoformat(),
+            'end-date': match.end_date.isoformat(),
+            'slug': match.slug
+        }
+
+        response.append(item)
+
+    return response
+
+
+if __name__ == '__main__':
+    ctx = app.test_request_context()
+    ctx.push()
+
+    serializer = serializers.for_model(Match, Match._list_fields)
+    start = datetime.datetime(2017, 10, 1, 10, 0, 0)
+
+    for size in (20, 500):
+        rows = [
+            (
+                'Match %d' % i,
+                start,
+                start + datetime.timedelta(days=7),
+                'match-%d' % i
+            )
+            for i in range(size)
+        ]
+
+        def instances():
+            # Approximates the cost of loading instances in a query
+            return [
+                Match(title=t, start_date=s, end_date=e, slug=slug)
+                for t, s, e, slug in rows
+            ]
+
+        matches = instances()
+
+        print('match list, %d matches' % size)
+        measure('  orm + dict', lambda: orm_items(instances()), 100)
+        measure('  dict (loaded instances)', lambda: orm_items(matches), 100)
+        measure('  serializer (rows)', lambda: serializer.rows(rows), 100)
@@ -33,6 +33,14 @@ from flask_mail import Mail
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from loc.bootstrap import BASE_CONFIG, make_celery
+from loc.helper.cache import CountCache, ResponseCache, TokenCache
+from loc.helper.compression import Compression
+from loc.helper.encoding import JSONEncoder
+from loc.helper.hashing import BcryptBusy, BcryptExecutor
+from loc.helper.i18n import MessageCatalogs
+from loc.helper.instrumentation import QueryStats
+from loc.helper.ratelimit import RateLimiter
+from loc.helper.revocation import Revocations
 
 import os
 
@@ -62,15 +70,41 @@ from loc import models
 # Database migrations
 migrate = Migrate(app, db)
 
+# Per-request SQL instrumentation
+query_stats = QueryStats(app)
 
-# Setup Flask-Babel
+
+# Setup Flask-Babel and message tables
 babel = Babel(app)
+catalogs = MessageCatalogs(app, babel)
 
 
 # Setup Flask-Mail
 mail = Mail(app)
 
 
+# Setup verified token cache and revocation broadcast
+token_cache = TokenCache(app)
+revocations = Revocations(app, token_cache)
+
+
+# Setup bcrypt executor
+bcrypt_executor = BcryptExecutor(app)
+
+
+# Setup rate limiting
+rate_limiter = RateLimiter(app)
+
+
+# Setup response encoding, compression and caching
+json_encoder = JSONEncoder(app)
+compression = Compression(app)
+response_cache = ResponseCache(app)
+
+# Setup cache of list totals
+count_cache = CountCache(app)
+
+
 # Setup Celery
 celery = make_celery(app)
 
@@ -90,11 +124,25 @@ app.register_blueprint(common_endpoints)
 app.register_blueprint(v1_account, url_prefix='/v1/account')
 app.register_blueprint(v1_matches, url_prefix='/v1/matches')
 app.register_blueprint(v1_parties, url_prefix='/v1/parties')
+app.register_blueprint(v1_users, url_prefix='/v1/users')
 app.register_blueprint(v1_admin, url_prefix='/v1/admin')
 
 # Cli commands
 from loc import cli
 
+# Error handlers
+from loc.helper import messages as m, util
+
+@app.errorhandler(BcryptBusy)
+def bcrypt_busy(e):
+    """Fail fast when there is no room in the bcrypt queue."""
+    response = util.api_error(m.SERVER_BUSY)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+
+    return response
+
+
 @app.route('/')
 def root():
     content = (
@@ -35,12 +35,82 @@ BASE_CONFIG = {
     # Server information
     'SERVER_DESCRIPTION': 'Reference LoC server implementation',
 
+    # Supported languages (first is the default)
+    'LANGUAGES': ['en'],
+    'BABEL_DEFAULT_LOCALE': 'en',
+
     # Flask-SQLAlchemy
     'SQLALCHEMY_TRACK_MODIFICATIONS': False,
 
+    # Per-request SQL statistics (debug headers, slow statement seconds) and
+    # failing requests that exceed the query budget of their view (tests)
+    'QUERY_STATS_ENABLED': True,
+    'QUERY_STATS_HEADERS': False,
+    'QUERY_STATS_SLOW_TIME': 0.5,
+    'QUERY_BUDGET_STRICT': False,
+
     # JWT
     'JWT_ALGORITHM': 'HS512',
 
+    # Issue short-lived access tokens (seconds) and refresh tokens on login
+    'JWT_STATELESS': False,
+    'JWT_ACCESS_EXPIRATION': 900,
+
+    # Verified token cache (size 0 disables it)
+    'AUTH_CACHE_SIZE': 10000,
+    'AUTH_CACHE_TTL': 60,
+
+    # Token revocation broadcast (memory, file or redis)
+    'REVOCATION_BACKEND': 'memory',
+    'REVOCATION_FILE': None,
+    'REVOCATION_URL': None,
+    'REVOCATION_POLL_INTERVAL': 1,
+
+    # bcrypt executor of each worker process (processes, pending operations,
+    # Retry-After seconds and seconds between statistics in the log)
+    'BCRYPT_WORKERS': 2,
+    'BCRYPT_QUEUE_SIZE': 64,
+    'BCRYPT_RETRY_AFTER': 1,
+    'BCRYPT_STATS_INTERVAL': 300,
+
+    # Number of reverse proxies in front of the server, whose X-Forwarded-For
+    # entries are trusted to obtain the address of clients
+    'TRUSTED_PROXIES': 0,
+
+    # Rate limiting (memory or redis), limits are (requests, seconds)
+    'RATELIMIT_ENABLED': True,
+    'RATELIMIT_BACKEND': 'memory',
+    'RATELIMIT_URL': None,
+    'RATELIMITS': {
+        'login-ip': (20, 60),
+        'login-user': (10, 600),
+        'signup-ip': (5, 3600),
+        'signup-email': (3, 3600),
+        'forgot-password-ip': (5, 3600),
+        'forgot-password-email': (3, 3600)
+    },
+
+    # Response encoding (auto, orjson or stdlib)
+    'JSON_ENCODER': 'auto',
+    'JSON_PRETTYPRINT': False,
+
+    # Formats clients may request with the Accept header (json, msgpack, cbor)
+    'RESPONSE_FORMATS': ['json', 'msgpack', 'cbor'],
+
+    # Response compression (gzip or brotli) for bodies of at least MIN_SIZE
+    'COMPRESS_ENABLED': True,
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_LEVEL': 6,
+    'COMPRESS_BROTLI_QUALITY': 4,
+
+    # Cache of public responses (size 0 disables it)
+    'RESPONSE_CACHE_SIZE': 1024,
+    'RESPONSE_CACHE_TTL': 10,
+
+    # Cache of list totals (size 0 disables it)
+    'COUNT_CACHE_SIZE': 1024,
+    'COUNT_CACHE_TTL': 30,
+
     # Celery
     'CELERY_BROKER_URL': 'redis://localhost:6379',
     'CELERY_BACKEND': 'redis://localhost:6379',
@@ -50,6 +120,9 @@ BASE_CONFIG = {
     'PARTIES_PER_PAGE': 30,
     'USERS_PER_PAGE': 50,
 
+    # Records fetched at once when streaming collections
+    'STREAM_BATCH_SIZE': 500,
+
     # Client-pairing info
     'CLIENT_ROOT': 'localhost',
     'CLIENT_FORGOT_PASSWORD_URL': 'localhost/%(token)s'
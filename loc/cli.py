@@ -27,8 +27,10 @@
 
 """Custom server commands."""
 
+import bcrypt
 import datetime
 import click
+import time
 from loc import app, db
 from loc.helper import util
 from loc.models import *
@@ -168,3 +170,53 @@ def dbseed():
     db.session.add(Submission(party_owner_id=7, match_id=2, title='', description='', url=''))
 
     db.session.commit()
+
+
+@app.cli.command('bcrypt-calibrate')
+@click.option(
+    '--target',
+    default=250,
+    help='Target time (in milliseconds) for a single hash.'
+)
+@click.option(
+    '--samples',
+    default=3,
+    help='Number of hashes to compute for each cost.'
+)
+def bcrypt_calibrate(target, samples):
+    """Benchmark bcrypt and recommend a value for BCRYPT_ROUNDS."""
+    current = app.config.get('BCRYPT_ROUNDS', 12)
+    recommended = None
+
+    click.echo('Target: %d ms per hash (current BCRYPT_ROUNDS: %d)\n' % (
+        target,
+        current
+    ))
+
+    # Each round doubles the time, stop once the target is clearly exceeded
+    for rounds in range(4, 32):
+        timings = []
+        for i in range(samples):
+            salt = bcrypt.gensalt(rounds=rounds)
+            start = time.perf_counter()
+            bcrypt.hashpw(b'calibration-password', salt)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        median = sorted(timings)[len(timings) // 2]
+        click.echo('%2d rounds: %8.1f ms' % (rounds, median))
+
+        if median > target:
+            break
+
+        recommended = rounds
+
+    if recommended is None:
+        click.echo('\nNo cost meets the target, the minimum is 4 rounds')
+        return
+
+    click.echo('\nRecommended: BCRYPT_ROUNDS = %d' % recommended)
+
+    if recommended != current:
+        click.echo(
+            'Existing passwords will be rehashed when their users log in'
+        )
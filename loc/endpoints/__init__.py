@@ -27,8 +27,8 @@
 
 """Common endpoints."""
 
-from flask import Blueprint, current_app, jsonify
-from loc import __version__, __api__versions__
+from flask import Blueprint, current_app
+from loc import __version__, __api__versions__, json_encoder
 
 common_endpoints = Blueprint('common_endpoints', __name__)
 
@@ -42,4 +42,4 @@ def server_info():
         'api': __api__versions__
     }
 
-    return jsonify(**response), 200
+    return json_encoder.response(response), 200
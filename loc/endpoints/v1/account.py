@@ -28,11 +28,17 @@
 """/v1/account endpoints."""
 
 from email_validator import validate_email, EmailNotValidError
-from flask import Blueprint, current_app, request
+from flask import Blueprint, current_app
 from sqlalchemy import or_
-from loc import db
-from loc.helper import messages as m, mails, util
-from loc.helper.deco import login_required, check_required, check_optional
+from loc import count_cache, db
+from loc.helper import auth, messages as m, mails, util
+from loc.helper.deco import (
+    login_required,
+    query_budget,
+    rate_limit,
+    with_params
+)
+from loc.helper.schema import Param
 from loc.helper.util import api_error, api_fail, api_success
 from loc.models import User
 from loc.tasks import async_mail as send_mail
@@ -44,8 +50,14 @@ v1_account = Blueprint('v1_account', __name__)
 
 
 @v1_account.route('/signup', methods=['POST'])
-@check_required([('username', str), ('email', str), ('password', str)])
-def signup():
+@rate_limit('signup-ip')
+@rate_limit('signup-email', 'email')
+@with_params(
+    Param('username', str),
+    Param('email', str),
+    Param('password', str),
+)
+def signup(params):
     """Create a new user.
 
     Params:
@@ -53,10 +65,9 @@ def signup():
         email (str): Email for the new user (unique).
         password (str): Password to use.
     """
-    received = request.get_json()
-    username = received.get('username')
-    email = received.get('email')
-    password = received.get('password')
+    username = params.username
+    email = params.email
+    password = params.password
 
     # Check if user already exists
     user_exists = db.session.query(
@@ -108,6 +119,8 @@ def signup():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    # Totals of user lists changed
+    count_cache.invalidate('users')
 
     # Send welcome email
     send_mail(
@@ -127,23 +140,32 @@ def signup():
 
 
 @v1_account.route('/login', methods=['POST'])
-@check_required([('username', str), ('password', str)])
-@check_optional([('remember-me', bool)])
-def login():
+@rate_limit('login-ip')
+@rate_limit('login-user', 'username')
+@with_params(
+    Param('username', str),
+    Param('password', str),
+    Param('remember-me', bool, default=False),
+)
+def login(params):
     """Perform login using the provided credentials.
 
     The password must be hashed and checked against the one stored in database.
+    If the stored hash was generated with a cost other than `BCRYPT_ROUNDS`,
+    the password is hashed again.
 
     Params:
         username (str): Username to use for login.
         password (str): Password to use for login.
         remember-me (bool): Optional. Whether the session should remain active
             or expire.
+
+    If stateless tokens are enabled (`JWT_STATELESS` setting), a short-lived
+    access token is returned along with a refresh token to renew it.
     """
-    received = request.get_json()
-    username = received.get('username')
-    password = received.get('password')
-    remember = received.get('remember-me', False)
+    username = params.username
+    password = params.password
+    remember = params.remember_me
 
     # Check user record
     user = User._by_username(username, False)
@@ -152,32 +174,83 @@ def login():
         return api_fail(username=m.CHECK_DATA, password=m.CHECK_DATA), 401
 
 
-    # Create JWT token
-    if remember:
-        expire = util.generate_expiration_date(years=1)
+    # Rehash password if the configured cost changed
+    if util.hash_needs_update(user.password):
+        try:
+            user.password = util.hash_password(password)
+            db.session.commit()
+
+        except Exception as e:
+            # Not critical, will be retried in next login
+            # TODO log
+            db.session.rollback()
+
+
+    # Create JWT token(s)
+    if current_app.config['JWT_STATELESS']:
+        response = {
+            'jwt': auth.issue_access_token(user),
+            'refresh': auth.issue_token(user, remember, 'refresh')
+        }
 
     else:
-        expire = util.generate_expiration_date(days=5)
-
-    encoded = jwt.encode(
-        {
-            'sub': user.id,
-            'iat': datetime.datetime.utcnow(),
-            'exp': expire,
-            'counter': user._jwt_counter
-        },
-        current_app.config['SECRET_KEY'],
-        algorithm=current_app.config['JWT_ALGORITHM']
-    ).decode()
+        response = {'jwt': auth.issue_token(user, remember)}
+
+    return api_success(**response), 200
+
+
+@v1_account.route('/refresh', methods=['POST'])
+@with_params(Param('refresh', str))
+def refresh(params):
+    """Obtain a new access token using a refresh token.
+
+    Only available when stateless access tokens are enabled. This is the only
+    place where the JWT counter of the user is checked for these tokens.
+
+    Params:
+        refresh (str): Refresh token obtained in login().
+    """
+
+    # Decode
+    try:
+        decoded = jwt.decode(
+            params.refresh,
+            current_app.config['SECRET_KEY']
+        )
+
+    except jwt.exceptions.DecodeError:
+        # TODO log
+        return api_fail(refresh=m.JWT_ERROR), 401
+
+    except jwt.ExpiredSignatureError:
+        return api_fail(refresh=m.JWT_EXPIRED), 401
 
-    return api_success(jwt=encoded), 200
+    if decoded.get('type') != 'refresh':
+        return api_fail(refresh=m.JWT_ERROR), 401
+
+
+    # Check user record
+    user = User.query.filter_by(
+        id=decoded.get('sub', -1),
+        is_deleted=False
+    ).first()
+
+    if not user:
+        return api_error(m.USER_NOT_FOUND), 401
+
+    # Token was invalidated?
+    if decoded.get('counter', -1) != user._jwt_counter:
+        return api_fail(refresh=m.JWT_EXPIRED), 401
+
+    return api_success(jwt=auth.issue_access_token(user)), 200
 
 
 @v1_account.route('/profile')
 @login_required
+@query_budget(1)
 def get_profile():
     """Obtain the profile of the logged in user."""
-    user = util.user_from_jwt(request.get_json().get('token'))
+    user = auth.current_user()
 
     if not user:
         return api_error(m.USER_NOT_FOUND), 404
@@ -192,22 +265,24 @@ def get_profile():
 
 @v1_account.route('/profile', methods=['PUT'])
 @login_required
-@check_optional([('name', str), ('email', str)])
-def update_profile():
+@with_params(
+    Param('name', str, default=None),
+    Param('email', str, default=None),
+)
+def update_profile(params):
     """Update user profile.
 
     Params:
         name (str): New name to use (may be empty)
         email (email): New email to use
     """
-    received = request.get_json()
-    user = util.user_from_jwt(received.get('token'))
+    user = auth.current_user()
 
     if not user:
         return api_error(m.USER_NOT_FOUND), 404
 
-    name = received.get('name')
-    email = received.get('email')
+    name = params.name
+    email = params.email
 
     # Nothing to update?
     if not name and not email:
@@ -248,26 +323,54 @@ def update_profile():
 
 @v1_account.route('/followers')
 @login_required
-def followers():
-    """Obtain a list of followers."""
-    user = util.user_from_jwt(request.get_json().get('token'))
+@with_params(Param('stream', str, default=None, choices=util.STREAM_FORMATS))
+@query_budget(2)
+def followers(params):
+    """Obtain a list of followers.
+
+    Params:
+        stream (str): Optional. Stream the users as a JSON array (`json`) or
+            as NDJSON (`ndjson`).
+    """
+    user = auth.current_user()
 
     if not user:
         return api_error(m.USER_NOT_FOUND), 404
 
+    if params.stream:
+        return util.api_stream(
+            user.followers.with_entities(User.username),
+            lambda users: [f.username for f in users],
+            params.stream
+        )
+
     response = [f.username for f in user.followers]
 
     return api_success(followers=response), 200
 
 @v1_account.route('/following')
 @login_required
-def following():
-    """Obtain a list of users being followed."""
-    user = util.user_from_jwt(request.get_json().get('token'))
+@with_params(Param('stream', str, default=None, choices=util.STREAM_FORMATS))
+@query_budget(2)
+def following(params):
+    """Obtain a list of users being followed.
+
+    Params:
+        stream (str): Optional. Stream the users as a JSON array (`json`) or
+            as NDJSON (`ndjson`).
+    """
+    user = auth.current_user()
 
     if not user:
         return api_error(m.USER_NOT_FOUND), 404
 
+    if params.stream:
+        return util.api_stream(
+            user.following.with_entities(User.username),
+            lambda users: [f.username for f in users],
+            params.stream
+        )
+
     response = [f.username for f in user.following]
 
     return api_success(following=response), 200
@@ -275,8 +378,11 @@ def following():
 
 @v1_account.route('/change-password', methods=['POST'])
 @login_required
-@check_required([('current-password', str), ('new-password', str)])
-def change_password():
+@with_params(
+    Param('current-password', str),
+    Param('new-password', str),
+)
+def change_password(params):
     """Update account password.
 
     This invalidates old JWT tokens.
@@ -285,14 +391,13 @@ def change_password():
         current-password (str): Currently defined password.
         new-password (str): New password to use.
     """
-    received = request.get_json()
-    user = util.user_from_jwt(received.get('token'))
+    user = auth.current_user()
 
     if not user:
         return api_error(m.USER_NOT_FOUND), 404
 
-    current_password = received.get('current-password')
-    new_password = received.get('new-password')
+    current_password = params.current_password
+    new_password = params.new_password
 
 
     # Check current password
@@ -322,11 +427,15 @@ def change_password():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    auth.invalidate_user(user.id, user._jwt_counter)
+
     return api_success(), 200
 
 @v1_account.route('/forgot-password', methods=['POST'])
-@check_required([('email', str)])
-def forgot_password():
+@rate_limit('forgot-password-ip')
+@rate_limit('forgot-password-email', 'email')
+@with_params(Param('email', str))
+def forgot_password(params):
     """Generate and send a token to reset user password.
 
     This endpoint returns a success even if the email does not exist.
@@ -334,8 +443,7 @@ def forgot_password():
     Params:
         email (str): Email for which the password was forgotten.
     """
-    received = request.get_json()
-    email = received.get('email')
+    email = params.email
 
     # Check user record
     user = User._by_email(email)
@@ -383,15 +491,15 @@ def forgot_password():
     return api_success(), 200
 
 @v1_account.route('/reset-password')
-@check_required([('token', str)])
-def validate_password_token():
+@with_params(Param('token', str))
+@query_budget(1)
+def validate_password_token(params):
     """Validate the token generated in forgot_password().
 
     Params:
         token (str): Reset password token.
     """
-    received = request.get_json()
-    reset_token = received.get('token')
+    reset_token = params.token
 
     # Check if token is valid
     token_valid = db.session.query(
@@ -410,8 +518,12 @@ def validate_password_token():
     return api_success(), 200
 
 @v1_account.route('/reset-password', methods=['POST'])
-@check_required([('token', str), ('password', str), ('confirm-password', str)])
-def reset_password():
+@with_params(
+    Param('token', str),
+    Param('password', str),
+    Param('confirm-password', str),
+)
+def reset_password(params):
     """Reset user password using token generated in forgot_password().
 
     Params:
@@ -419,10 +531,9 @@ def reset_password():
         password (str): New password
         confirm-password (str): Password confirmation.
     """
-    received = request.get_json()
-    token = received.get('token')
-    password = received.get('password')
-    confirm_password = received.get('confirm-password')
+    token = params.token
+    password = params.password
+    confirm_password = params.confirm_password
 
     # Check minimum password length
     if len(password) < 8:
@@ -469,4 +580,6 @@ def reset_password():
             db.session.rollback()
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
+    auth.invalidate_user(user.id, user._jwt_counter)
+
     return api_success(), 200
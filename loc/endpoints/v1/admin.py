@@ -27,33 +27,47 @@
 
 """/v1/admin endpoints."""
 
-from flask import Blueprint, current_app, request
-from loc import db
-from loc.helper import messages as m, util
-from loc.helper.deco import role_required, check_required, check_optional
+from flask import Blueprint, current_app
+from loc import count_cache, db, response_cache
+from loc.helper import auth, messages as m, pagination, util
+from loc.helper.deco import query_budget, role_required, with_params
+from loc.helper.schema import Param
+from loc.helper.serializers import Serializer
 from loc.helper.util import api_error, api_fail, api_success
-from loc.models import Follower, Match, MatchParticipant, User, Party
+from loc.models import Follower, Match, User, Party
 
 import datetime
 import slugify
 
 v1_admin = Blueprint('v1_admin', __name__)
 
+# Items of deleted records
+_deleted_match = Serializer([
+    ('title', Match.title),
+    ('delete-date', Match.delete_date),
+    ('slug', Match.slug)
+])
+
+_deleted_user = Serializer([
+    ('username', User.username),
+    ('delete-date', User.delete_date)
+])
+
 
 @v1_admin.route('/match', methods=['POST'])
 @role_required('admin')
-@check_required([
-    ('title', str),
-    ('short-description', str),
-    ('long-description', str),
-    ('start-date', str),
-    ('end-date', str),
-    ('min-members', int),
-    ('max-members', int),
-    ('is-visible', bool)
-])
-@check_optional([('slug', str)])
-def new_match():
+@with_params(
+    Param('title', str),
+    Param('short-description', str),
+    Param('long-description', str),
+    Param('start-date', datetime.datetime),
+    Param('end-date', datetime.datetime),
+    Param('min-members', int),
+    Param('max-members', int),
+    Param('is-visible', bool),
+    Param('slug', str, default=None),
+)
+def new_match(params):
     """Creates a new match.
 
     Params:
@@ -67,17 +81,16 @@ def new_match():
         is-visible (bool): Whether the match can be found.
         slug (str): Optional slug.
     """
-    received = request.get_json()
     data = {
-        'title': received.get('title'),
-        'short_description': received.get('short-description'),
-        'long_description': received.get('long-description'),
-        'start_date': received.get('start-date'),
-        'end_date': received.get('end-date'),
-        'min_members': received.get('min-members'),
-        'max_members': received.get('max-members'),
-        'is_visible': received.get('is-visible'),
-        'slug': received.get('slug')
+        'title': params.title,
+        'short_description': params.short_description,
+        'long_description': params.long_description,
+        'start_date': params.start_date,
+        'end_date': params.end_date,
+        'min_members': params.min_members,
+        'max_members': params.max_members,
+        'is_visible': params.is_visible,
+        'slug': params.slug
     }
 
     # Check some data
@@ -88,26 +101,6 @@ def new_match():
     if data['max_members'] < data['min_members']:
         errors['max-members'] = m.INVALID_VALUE
 
-
-    try:
-        data['start_date'] = datetime.datetime.strptime(
-            data['start_date'],
-            '%Y-%m-%d %H:%M:%S'
-        )
-
-    except ValueError:
-        errors['start-date'] = m.INVALID_VALUE
-
-    try:
-        data['end_date'] = datetime.datetime.strptime(
-            data['end_date'],
-            '%Y-%m-%d %H:%M:%S'
-        )
-
-    except ValueError as e:
-        errors['end-date'] = m.INVALID_VALUE
-
-
     if errors:
         return api_fail(**errors), 400
 
@@ -136,25 +129,28 @@ def new_match():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    # Totals of match lists changed
+    count_cache.invalidate('matches')
+
     return api_success(slug=new_match.slug), 201
 
 
 @v1_admin.route('/match', methods=['PUT'])
 @role_required('admin')
-@check_required([('match', str)])
-@check_optional([
-    ('title', str),
-    ('short-description', str),
-    ('long-description', str),
-    ('start-date', str),
-    ('end-date', str),
-    ('min-members', int),
-    ('max-members', int),
-    ('leaderboard', bool),
-    ('is-visible', bool),
-    ('slug', str)
-])
-def modify_match():
+@with_params(
+    Param('match', str),
+    Param('title', str, default=None),
+    Param('short-description', str, default=None),
+    Param('long-description', str, default=None),
+    Param('start-date', datetime.datetime, default=None),
+    Param('end-date', datetime.datetime, default=None),
+    Param('min-members', int, default=None),
+    Param('max-members', int, default=None),
+    Param('leaderboard', bool, default=None),
+    Param('is-visible', bool, default=None),
+    Param('slug', str, default=None),
+)
+def modify_match(params):
     """Modify a match.
 
     Params:
@@ -170,13 +166,12 @@ def modify_match():
         is-visible (bool): Whether the match can be found.
         slug (str): New slug for the match.
     """
-    received = request.get_json()
 
     # Query match
     match = (
         Match
         .query
-        .filter_by(slug=received.get('match'), is_deleted=False)
+        .filter_by(slug=params.match, is_deleted=False)
         .first()
     )
 
@@ -185,16 +180,16 @@ def modify_match():
 
     # Check some data
     data = {
-        'title': received.get('title'),
-        'short_description': received.get('short-description'),
-        'long_description': received.get('long-description'),
-        'start_date': received.get('start-date'),
-        'end_date': received.get('end-date'),
-        'min_members': received.get('min-members'),
-        'max_members': received.get('max-members'),
-        'leaderboard': received.get('leaderboard'),
-        'is_visible': received.get('is-visible'),
-        'slug': received.get('slug')
+        'title': params.title,
+        'short_description': params.short_description,
+        'long_description': params.long_description,
+        'start_date': params.start_date,
+        'end_date': params.end_date,
+        'min_members': params.min_members,
+        'max_members': params.max_members,
+        'leaderboard': params.leaderboard,
+        'is_visible': params.is_visible,
+        'slug': params.slug
     }
     errors = {}
     if data['min_members'] and data['min_members'] <= 0:
@@ -203,28 +198,6 @@ def modify_match():
     if data['max_members'] and data['max_members'] <= 0:
         errors['max-members'] = m.INVALID_VALUE
 
-
-    if data['start_date']:
-        try:
-            data['start_date'] = datetime.datetime.strptime(
-                data['start_date'],
-                '%Y-%m-%d %H:%M:%S'
-            )
-
-        except ValueError:
-            errors['start-date'] = m.INVALID_VALUE
-
-    if data['end_date']:
-        try:
-            data['end_date'] = datetime.datetime.strptime(
-                data['end_date'],
-                '%Y-%m-%d %H:%M:%S'
-            )
-
-        except ValueError as e:
-            errors['end-date'] = m.INVALID_VALUE
-
-
     if errors:
         return api_fail(**errors), 400
 
@@ -268,22 +241,28 @@ def modify_match():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    # Cached public pages and totals may be outdated
+    response_cache.clear()
+    count_cache.invalidate('matches')
+
     return api_success(**response), 200
 
 
 @v1_admin.route('/match-delete', methods=['PUT'])
 @role_required('admin')
-@check_required([('match', str), ('delete', bool)])
-def toggle_match_delete():
+@with_params(
+    Param('match', str),
+    Param('delete', bool),
+)
+def toggle_match_delete(params):
     """Toggle deletion of a match.
 
     Params:
         match (str): Unique slug of the match.
         delete (bool): Flag indicating whether the match will be deleted.
     """
-    received = request.get_json()
-    slug = received.get('match')
-    do_delete = received.get('delete')
+    slug = params.match
+    do_delete = params.delete
 
     match = (
         Match
@@ -326,126 +305,178 @@ def toggle_match_delete():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    # Cached public pages and totals may be outdated
+    response_cache.clear()
+    count_cache.invalidate('matches')
+
     return api_success(**response), 200
 
 
 @v1_admin.route('/deleted-matches')
 @role_required('admin')
-@check_optional([('page', int)])
-def list_deleted_matches():
+@with_params(
+    Param('page', int, default=1),
+    Param('with-total', bool, default=False),
+    Param('approximate', bool, default=False),
+)
+@query_budget(2)
+def list_deleted_matches(params):
     """Return paginated list of deleted matches.
 
     Params:
         page (int): Optional. Page number to return
+        with-total (bool): Optional. Include the total number of matches and
+            pages
+        approximate (bool): Optional. Estimate the total instead of counting
+            the matches (faster on large tables)
     """
-    received = request.get_json()
-    if received:
-        page = received.get('page', 1)
-    else:
-        page = 1
+    page = params.page
 
     # Query matches
     per_page = current_app.config['MATCHES_PER_PAGE']
 
-    matches = (
-        Match
-        .query
+    query = (
+        _deleted_match.query(Match.query)
         .filter(
             Match.is_deleted == True,
         )
         .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
+    matches = pagination.paginate(query, page, per_page)
 
-    for match in matches.items:
-        item = {
-            'title': match.title,
-            'delete-date': match.delete_date,
-            'slug': match.slug
-        }
+    if params.with_total:
+        matches.total = util.query_total(
+            query,
+            'matches',
+            'deleted',
+            params.approximate
+        )
 
-        response.append(item)
+    response = _deleted_match.rows(matches.items)
 
-    return api_success(**util.paginated(page, matches.pages, response)), 200
+    return api_success(**matches.as_dict(response)), 200
 
 
 @v1_admin.route('/users')
 @role_required('admin')
-@check_optional([('page', int)])
-def list_users():
+@with_params(
+    Param('page', int, default=1),
+    Param('with-total', bool, default=False),
+    Param('approximate', bool, default=False),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(2)
+def list_users(params):
     """Return paginated list of active users.
 
     Params:
         page (int): Optional. Page number to return
+        with-total (bool): Optional. Include the total number of users and
+            pages
+        approximate (bool): Optional. Estimate the total instead of counting
+            the users (faster on large tables)
+        stream (str): Optional. Send all the users instead of a page, streamed
+            as a JSON array (`json`) or as NDJSON (`ndjson`).
     """
-    received = request.get_json()
-    if received:
-        page = received.get('page', 1)
-    else:
-        page = 1
+    page = params.page
 
     # Query matches
-    per_page = current_app.config['USERS_PER_PAGE']
-
-    users = (
+    query = (
         User
         .query
         .filter(
             User.is_deleted == False,
         )
         .order_by(User.username.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
+    query = query.with_entities(User.username)
+
+    if params.stream:
+        return util.api_stream(
+            query,
+            lambda users: [u.username for u in users],
+            params.stream
+        )
+
+    per_page = current_app.config['USERS_PER_PAGE']
+    users = pagination.paginate(query, page, per_page)
+
+    if params.with_total:
+        users.total = util.query_total(
+            query,
+            'users',
+            'active',
+            params.approximate
+        )
+
     response = [u.username for u in users.items]
 
-    return api_success(**util.paginated(page, users.pages, response)), 200
+    return api_success(**users.as_dict(response)), 200
 
 
 @v1_admin.route('/deleted-users')
 @role_required('admin')
-@check_optional([('page', int)])
-def list_deleted_users():
+@with_params(
+    Param('page', int, default=1),
+    Param('with-total', bool, default=False),
+    Param('approximate', bool, default=False),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(2)
+def list_deleted_users(params):
     """Return paginated list of deleted/banned users.
 
     Params:
         page (int): Optional. Page number to return
+        with-total (bool): Optional. Include the total number of users and
+            pages
+        approximate (bool): Optional. Estimate the total instead of counting
+            the users (faster on large tables)
+        stream (str): Optional. Send all the users instead of a page, streamed
+            as a JSON array (`json`) or as NDJSON (`ndjson`).
     """
-    received = request.get_json()
-    if received:
-        page = received.get('page', 1)
-    else:
-        page = 1
+    page = params.page
 
     # Query matches
-    per_page = current_app.config['USERS_PER_PAGE']
-
-    users = (
+    query = (
         User
         .query
         .filter(
             User.is_deleted == True,
         )
         .order_by(User.username.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
-    for user in users.items:
-        response.append({
-            'username': user.username,
-            'delete-date': user.delete_date
-        })
+    query = _deleted_user.query(query)
+
+    if params.stream:
+        return util.api_stream(query, _deleted_user.rows, params.stream)
+
+    per_page = current_app.config['USERS_PER_PAGE']
+    users = pagination.paginate(query, page, per_page)
+
+    if params.with_total:
+        users.total = util.query_total(
+            query,
+            'users',
+            'deleted',
+            params.approximate
+        )
 
-    return api_success(**util.paginated(page, users.pages, response)), 200
+    response = _deleted_user.rows(users.items)
+
+    return api_success(**users.as_dict(response)), 200
 
 
 @v1_admin.route('/user-delete', methods=['PUT'])
 @role_required('admin')
-@check_required([('user', str), ('delete', bool)])
-def toggle_user_delete():
+@with_params(
+    Param('user', str),
+    Param('delete', bool),
+)
+def toggle_user_delete(params):
     """Toggle deletion of a user.
 
     This invalidates all JWT tokens.
@@ -454,9 +485,8 @@ def toggle_user_delete():
         user (str): Username of the user to delete.
         delete (bool): Flag indicating whether the match will be deleted.
     """
-    received = request.get_json()
-    username = received.get('user')
-    do_delete = received.get('delete')
+    username = params.user
+    do_delete = params.delete
 
     user = (
         User
@@ -500,23 +530,40 @@ def toggle_user_delete():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    if do_delete:
+        auth.invalidate_user(user.id, user._jwt_counter)
+
+    # Totals of user lists changed
+    count_cache.invalidate('users')
+
     return api_success(**response), 200
 
 
 @v1_admin.route('/match-leaderboard')
 @role_required('admin')
-@check_required([('match', str)])
-@check_optional([('page', int)])
-def get_match_leaderboard():
+@with_params(
+    Param('match', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(4)
+def get_match_leaderboard(params):
     """Obtain paginated leaderboard of the match.
 
     Params:
         match (str): Unique slug of the match.
         page (int): Optional. Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
+        stream (str): Optional. Send all the parties instead of a page, streamed
+            as a JSON array (`json`) or as NDJSON (`ndjson`).
     """
-    received = request.get_json()
-    slug = received.get('match')
-    page = received.get('page', 1)
+    slug = params.match
+    page = params.page
 
     # Query match
     match = Match._by_slug(slug)
@@ -525,61 +572,57 @@ def get_match_leaderboard():
         return api_fail(match=m.MATCH_NOT_FOUND), 404
 
     # Query parties
-    per_page = current_app.config['PARTIES_PER_PAGE']
-    parties = (
+    query = (
         Party
         .query
         .filter_by(match_id=match.id, is_participating=True)
-        .order_by(Party.position.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
-
-    for party in parties.items:
-        party_details = {
-            'leader': '',
-            'position': party.position,
-            'members': []
-        }
-
-        members = (
-            db.session
-            .query(User.id, User.username)
-            .join(MatchParticipant, User.id==MatchParticipant.user_id)
-            .filter(
-                MatchParticipant.party_owner_id == party.owner_id,
-                MatchParticipant.match_id == match.id,
-                User.is_deleted == False
-            )
-            .all()
+    if params.stream:
+        return util.api_stream(
+            util.LEADERBOARD_ORDER.order(query),
+            lambda parties: util.party_items(match.id, parties, True),
+            params.stream
         )
 
-        for member in members:
-            if member[0] == party.owner_id:
-                party_details['leader'] = member[1]
+    per_page = current_app.config['PARTIES_PER_PAGE']
 
-            party_details['members'].append(member[1])
+    try:
+        parties, response = util.leaderboard_page(
+            match.id,
+            page,
+            params.cursor,
+            per_page
+        )
 
-        response.append(party_details)
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
+    if params.with_total:
+        parties.total = util.query_total(
+            util.LEADERBOARD_ORDER.filter(query),
+            ('match', match.id),
+            'leaderboard'
+        )
 
-    return api_success(util.paginated(page, parties.pages, response)), 200
+    return api_success(parties.as_dict(response)), 200
 
 
 @v1_admin.route('/match-leaderboard', methods=['PUT'])
 @role_required('admin')
-@check_required([('match', str), ('positions', list)])
-def set_match_leaderboard():
+@with_params(
+    Param('match', str),
+    Param('positions', list),
+)
+def set_match_leaderboard(params):
     """Obtain paginated leaderboard of the match.
 
     Params:
         match (str): Unique slug of the match.
         positions (list[dict]): List of parties to update and their positions.
     """
-    received = request.get_json()
-    slug = received.get('match')
-    positions = received.get('positions')
+    slug = params.match
+    positions = params.positions
 
     # Query match
     match = Match._by_slug(slug)
@@ -636,4 +679,8 @@ def set_match_leaderboard():
             db.session.rollback()
             return api_error(m.RECORD_CREATE_ERROR), 500
 
+    # Cached public pages and totals may be outdated
+    response_cache.clear()
+    count_cache.invalidate(('match', match.id))
+
     return api_success(*response), 200
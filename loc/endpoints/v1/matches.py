@@ -27,12 +27,19 @@
 
 """/v1/account endpoints."""
 
-from flask import Blueprint, current_app, request
-from loc import db
-from loc.helper import messages as m, util
-from loc.helper.deco import login_required, check_required, check_optional
+from flask import Blueprint, current_app, g
+from loc import count_cache, db
+from loc.helper import messages as m, serializers, util
+from loc.helper.deco import (
+    cached_response,
+    login_required,
+    query_budget,
+    with_params
+)
+from loc.helper.schema import Param
 from loc.helper.util import api_error, api_fail, api_success
 from loc.models import Match, MatchParticipant, Party, Submission, User
+from sqlalchemy.orm import undefer
 
 import datetime
 
@@ -40,126 +47,183 @@ v1_matches = Blueprint('v1_matches', __name__)
 
 
 @v1_matches.route('/list')
-@check_optional([('page', int)])
-def list_current_matches():
+@with_params(
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(2)
+def list_current_matches(params):
     """Return paginated list of current matches.
 
     Params:
         page (int): Optional. Page number to return
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number
+        with-total (bool): Optional. Include the total number of matches and
+            pages
+        fields (list[str]): Optional. Fields of the matches to return
     """
-    received = request.get_json()
-    if received:
-        page = received.get('page', 1)
-    else:
-        page = 1
+    fields = params.fields
 
     # Query matches
     per_page = current_app.config['MATCHES_PER_PAGE']
 
-    matches = (
-        Match
-        .query
+    serializer = serializers.for_model(Match, fields)
+
+    query = (
+        serializer.query(Match.query)
         .filter(
             Match.is_visible == True,
             Match.is_deleted == False,
             Match.end_date >= datetime.datetime.utcnow()
         )
-        .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
+    try:
+        matches = util.MATCH_ORDER.paginate(
+            query,
+            params.page,
+            params.cursor,
+            per_page
+        )
+
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
-    for match in matches.items:
-        item = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+    if params.with_total:
+        matches.total = util.query_total(query, 'matches', 'current')
 
-        response.append(item)
+    response = serializer.rows(matches.items)
 
-    return api_success(**util.paginated(page, matches.pages, response)), 200
+    return api_success(**matches.as_dict(response)), 200
 
 
 @v1_matches.route('/list-past')
-@check_optional([('page', int)])
-def list_past_matches():
+@with_params(
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(2)
+def list_past_matches(params):
     """Return paginated list of past matches.
 
     Params:
         page (int): Optional. Page number to return
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number
+        with-total (bool): Optional. Include the total number of matches and
+            pages
+        fields (list[str]): Optional. Fields of the matches to return
     """
-    received = request.get_json()
-    if received:
-        page = received.get('page', 1)
-    else:
-        page = 1
+    fields = params.fields
 
     # Query matches
     per_page = current_app.config['MATCHES_PER_PAGE']
 
-    matches = (
-        Match
-        .query
+    serializer = serializers.for_model(Match, fields)
+
+    query = (
+        serializer.query(Match.query)
         .filter(
             Match.is_visible == True,
             Match.is_deleted == False,
             Match.end_date <= datetime.datetime.utcnow()
         )
-        .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
+    try:
+        matches = util.MATCH_ORDER.paginate(
+            query,
+            params.page,
+            params.cursor,
+            per_page
+        )
+
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
-    for match in matches.items:
-        item = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+    if params.with_total:
+        matches.total = util.query_total(query, 'matches', 'past')
 
-        response.append(item)
+    response = serializer.rows(matches.items)
 
-    return api_success(**util.paginated(page, matches.pages, response)), 200
+    return api_success(**matches.as_dict(response)), 200
 
 
 @v1_matches.route('/info')
-@check_required([('match', str)])
-def match_info():
+@with_params(
+    Param('match', str),
+    Param('fields', list, default=None, choices=Match._fields),
+)
+@query_budget(1)
+def match_info(params):
     """Get details for a given match.
 
     Params:
         match (str): Unique slug of the match.
+        fields (list[str]): Optional. Fields of the match to return (all by
+            default)
     """
-    slug = request.get_json().get('match')
+    slug = params.match
+    fields = params.fields
 
-    # Query match
-    match = Match._by_slug(slug)
+    # Query match (start date is always needed to show the long description)
+    columns = Match._columns(Match._fields if fields is None else fields)
+
+    if 'start_date' not in columns:
+        columns.append('start_date')
+
+    match = Match._by_slug(slug, columns=columns)
 
     if not match:
         return api_fail(match=m.MATCH_NOT_FOUND), 404
 
-    response = match.as_dict(match.start_date <= datetime.datetime.utcnow())
+    response = match.as_dict(
+        match.start_date <= datetime.datetime.utcnow(),
+        fields
+    )
 
     return api_success(**response), 200
 
 @v1_matches.route('/leaderboard')
-@check_required([('match', str)])
-@check_optional([('page', int)])
-def match_leaderboard():
+@cached_response
+@with_params(
+    Param('match', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(4)
+def match_leaderboard(params):
     """Obtain paginated leaderboard of the match.
 
     Params:
         match (str): Unique slug of the match.
         page (int): Optional. Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
+        stream (str): Optional. Send all the parties instead of a page, streamed
+            as a JSON array (`json`) or as NDJSON (`ndjson`).
     """
-    received = request.get_json()
-    slug = received.get('match')
-    page = received.get('page', 1)
+    slug = params.match
+    page = params.page
 
     # Query match
     match = Match._by_slug(slug)
@@ -169,67 +233,60 @@ def match_leaderboard():
 
     # Is leaderboard posted?
     if not match.leaderboard:
-        return api_success(**util.paginated(1, 1, [])), 200
+        if params.stream:
+            return util.api_stream([], None, params.stream)
+
+        return api_success(**util.paginated(1, [])), 200
 
     # Query parties
-    per_page = current_app.config['PARTIES_PER_PAGE']
-    parties = (
+    query = (
         Party
         .query
         .filter_by(match_id=match.id, is_participating=True)
-        .order_by(Party.position.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
-
-    for party in parties.items:
-        party_details = {
-            'leader': '',
-            'position': party.position,
-            'members': []
-        }
-
-        members = (
-            db.session
-            .query(User.id, User.username)
-            .join(MatchParticipant, User.id==MatchParticipant.user_id)
-            .filter(
-                MatchParticipant.party_owner_id == party.owner_id,
-                MatchParticipant.match_id == match.id,
-                User.is_deleted == False
-            )
-            .all()
+    if params.stream:
+        return util.api_stream(
+            util.LEADERBOARD_ORDER.order(query),
+            lambda parties: util.party_items(match.id, parties, True),
+            params.stream
         )
 
-        for member in members:
-            if member[0] == party.owner_id:
-                party_details['leader'] = member[1]
+    per_page = current_app.config['PARTIES_PER_PAGE']
 
-            party_details['members'].append(member[1])
+    try:
+        parties, response = util.leaderboard_page(
+            match.id,
+            page,
+            params.cursor,
+            per_page
+        )
 
-        response.append(party_details)
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
+    if params.with_total:
+        parties.total = util.query_total(
+            util.LEADERBOARD_ORDER.filter(query),
+            ('match', match.id),
+            'leaderboard'
+        )
 
-    return api_success(util.paginated(page, parties.pages, response)), 200
+    return api_success(parties.as_dict(response)), 200
 
 
 @v1_matches.route('/join', methods=['POST'])
 @login_required
-@check_required([('match', str)])
-def join_match():
+@with_params(Param('match', str))
+def join_match(params):
     """Join the specified match.
 
     Params:
         match (str): Slug of the match to join
     """
-    received = request.get_json()
-    slug = received.get('match')
+    slug = params.match
 
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query match
@@ -292,25 +349,24 @@ def join_match():
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
 
+    # Totals of the match and the user lists changed
+    count_cache.invalidate(('match', match.id), ('user', user.id))
+
     response = {'party-token': party_token}
     return api_success(**response), 200
 
 @v1_matches.route('/leave', methods=['POST'])
 @login_required
-@check_required([('match', str)])
-def leave_match():
+@with_params(Param('match', str))
+def leave_match(params):
     """Leave the specified match.
 
     Params:
         match (str): Slug of the match to join
     """
-    received = request.get_json()
-    slug = received.get('match')
+    slug = params.match
 
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query match
@@ -375,14 +431,23 @@ def leave_match():
             db.session.rollback()
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
+    # Totals of the match and the user lists changed
+    count_cache.invalidate(('match', match.id), ('user', user.id))
 
     return api_success(), 200
 
 
 @v1_matches.route('/participants')
-@check_required([('match', str)])
-@check_optional([('page', int)])
-def list_parties():
+@cached_response
+@with_params(
+    Param('match', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(4)
+def list_parties(params):
     """List participating parties.
 
     Only accessible if the match has started.
@@ -390,12 +455,15 @@ def list_parties():
     Params:
         match (str): Unique slug of the match.
         page (int): Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
+        stream (str): Optional. Send all the parties instead of a page, streamed
+            as a JSON array (`json`) or as NDJSON (`ndjson`).
     """
-    received = request.get_json()
-    slug = received.get('match')
-    page = received.get('page', 1)
-
-    response = []
+    slug = params.match
+    page = params.page
 
     # Query match
     match = Match._by_slug(slug)
@@ -404,63 +472,66 @@ def list_parties():
         return api_fail(match=m.MATCH_NOT_FOUND), 404
 
     if match.start_date > datetime.datetime.utcnow():
-        return api_success(**util.paginated(1, 1, [])), 200
+        if params.stream:
+            return util.api_stream([], None, params.stream)
 
+        return api_success(**util.paginated(1, [])), 200
 
-    # Query parties
-    per_page = current_app.config['MATCHES_PER_PAGE']
 
-    parties = (
+    # Query parties
+    query = (
         Party
         .query
         .filter_by(match_id=match.id, is_participating=True)
-        .paginate(page, per_page, error_out=False)
     )
 
-    for party in parties.items:
-        party_details = {
-            'leader': '',
-            'members': []
-        }
-
-        members = (
-            db.session
-            .query(User.id, User.username)
-            .join(MatchParticipant, User.id==MatchParticipant.user_id)
-            .filter(
-                MatchParticipant.party_owner_id == party.owner_id,
-                MatchParticipant.match_id == match.id,
-                User.is_deleted == False
-            )
-            .all()
+    if params.stream:
+        return util.api_stream(
+            util.PARTY_ORDER.order(query),
+            lambda parties: util.party_items(match.id, parties),
+            params.stream
         )
 
-        for member in members:
-            if member[0] == party.owner_id:
-                party_details['leader'] = member[1]
+    per_page = current_app.config['MATCHES_PER_PAGE']
 
-            party_details['members'].append(member[1])
+    try:
+        parties = util.PARTY_ORDER.paginate(query, page, params.cursor, per_page)
 
-        response.append(party_details)
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
+    if params.with_total:
+        parties.total = util.query_total(
+            query,
+            ('match', match.id),
+            'participants'
+        )
+
+    response = util.party_items(match.id, [row[0] for row in parties.items])
 
-    return api_success(**util.paginated(page, parties.pages, response)), 200
+    return api_success(**parties.as_dict(response)), 200
 
 @v1_matches.route('/lfg')
-@check_required([('match', str)])
-@check_optional([('page', int)])
-def list_lfg():
+@with_params(
+    Param('match', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+)
+@query_budget(4)
+def list_lfg(params):
     """List parties looking for more members.
 
     Params:
         match (str): Unique slug of the match.
         page (int): Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
     """
-    received = request.get_json()
-    slug = received.get('match')
-    page = received.get('page', 1)
-
-    response = []
+    slug = params.match
+    page = params.page
 
     # Query match
     match = Match._by_slug(slug)
@@ -472,58 +543,46 @@ def list_lfg():
     # Query parties
     per_page = current_app.config['MATCHES_PER_PAGE']
 
-    parties = (
+    query = (
         Party
         .query
         .filter_by(match_id=match.id, is_public=True)
-        .paginate(page, per_page, error_out=False)
     )
 
-    for party in parties.items:
-        party_details = {
-            'leader': '',
-            'party-token': party.token,
-            'members': []
-        }
-
-        members = (
-            db.session
-            .query(User.id, User.username)
-            .join(MatchParticipant, User.id==MatchParticipant.user_id)
-            .filter(
-                MatchParticipant.party_owner_id == party.owner_id,
-                MatchParticipant.match_id == match.id,
-                User.is_deleted == False
-            )
-            .all()
-        )
-
-        for member in members:
-            if member[0] == party.owner_id:
-                party_details['leader'] = member[1]
+    try:
+        parties = util.PARTY_ORDER.paginate(query, page, params.cursor, per_page)
 
-            party_details['members'].append(member[1])
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
 
-        response.append(party_details)
+    if params.with_total:
+        parties.total = util.query_total(query, ('match', match.id), 'lfg')
 
+    response = util.party_items(
+        match.id,
+        [row[0] for row in parties.items],
+        with_token=True
+    )
 
-    return api_success(**util.paginated(page, parties.pages, response)), 200
+    return api_success(**parties.as_dict(response)), 200
 
 
 @v1_matches.route('/submission')
-@check_required([('match', str)])
-@check_optional([('party', str)])
-def show_submission():
+@with_params(
+    Param('match', str),
+    Param('party', str, default=None),
+)
+@query_budget(4)
+def show_submission(params):
     """Obtain details of the party's submission for the given match.
 
     Params:
         match (str): Unique slug of the match.
         party (str): Optional. Username of the party leader.
     """
-    received = request.get_json()
-    token = received.get('token')
-    slug = received.get('match')
-    party_owner = received.get('party')
+    token = util.request_token()
+    slug = params.match
+    party_owner = params.party
 
     match = Match._by_slug(slug)
 
@@ -549,15 +608,11 @@ def show_submission():
     else:
         return api_fail(party=m.FIELD_MISSING), 400
 
-    return result(match)
+    return result(match, params)
 
-def _show_submission_own(match):
+def _show_submission_own(match, params):
     """Show own submission."""
-    received = request.get_json()
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
     participant = (
         MatchParticipant
@@ -572,6 +627,7 @@ def _show_submission_own(match):
     submission = (
         Submission
         .query
+        .options(undefer(Submission.description))
         .filter_by(match_id=match.id, party_owner_id=participant.party_owner_id)
         .first()
     )
@@ -587,10 +643,9 @@ def _show_submission_own(match):
 
     return api_success(**response), 200
 
-def _show_submission_public(match):
+def _show_submission_public(match, params):
     """Show submission of other party."""
-    received = request.get_json()
-    party_owner = received.get('party')
+    party_owner = params.party
 
     user = User._by_username(party_owner)
 
@@ -600,6 +655,7 @@ def _show_submission_public(match):
     submission = (
         db.session
         .query(Submission)
+        .options(undefer(Submission.description))
         .join(Party, Submission.party_owner_id==Party.owner_id)
         .filter(
             Party.owner_id == user.id,
@@ -623,9 +679,13 @@ def _show_submission_public(match):
 
 @v1_matches.route('/submission', methods=['PUT'])
 @login_required
-@check_required([('match', str)])
-@check_optional([('title', str), ('description', str), ('url', str)])
-def edit_submission():
+@with_params(
+    Param('match', str),
+    Param('title', str, default=None),
+    Param('description', str, default=None),
+    Param('url', str, default=None),
+)
+def edit_submission(params):
     """Edit a submission.
 
     Can only be performed by the party leader.
@@ -636,13 +696,9 @@ def edit_submission():
         description (str): New description for the submission.
         url (str): New URL for the submission.
     """
-    received = request.get_json()
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
-    slug = received.get('match')
+    slug = params.match
 
 
     # Query match
@@ -667,9 +723,9 @@ def edit_submission():
         return api_fail(match=m.NOT_LEADER), 403
 
     # Try to update submission
-    submission.title = received.get('title') or submission.title
-    submission.description = received.get('description') or submission.description
-    submission.url = received.get('url') or submission.url
+    submission.title = params.title or submission.title
+    submission.description = params.description or submission.description
+    submission.url = params.url or submission.url
 
     try:
         correct = True
@@ -27,12 +27,14 @@
 
 """/v1/parties endpoints."""
 
-from flask import Blueprint, current_app, request
-from loc import db
-from loc.helper import messages as m, mails, util
-from loc.helper.deco import login_required, check_required, check_optional
+from flask import Blueprint, current_app, g
+from loc import count_cache, db
+from loc.helper import messages as m, mails, pagination, serializers, util
+from loc.helper.deco import login_required, query_budget, with_params
+from loc.helper.schema import Param
 from loc.helper.util import api_error, api_fail, api_success
 from loc.models import Match, MatchParticipant, User, Party
+from sqlalchemy.orm import contains_eager, joinedload
 from loc.tasks import async_mail as send_mail
 
 import datetime
@@ -42,15 +44,14 @@ v1_parties = Blueprint('v1_parties', __name__)
 
 @v1_parties.route('/join', methods=['POST'])
 @login_required
-@check_required([('party', str)])
-def join_party():
+@with_params(Param('party', str))
+def join_party(params):
     """Join the specified party.
 
     Params:
         party (str): Unique party token.
     """
-    received = request.get_json()
-    party_token = received.get('party')
+    party_token = params.party
 
     # Query party
     party = (
@@ -73,10 +74,7 @@ def join_party():
 
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Participant record
@@ -125,6 +123,8 @@ def join_party():
             db.session.rollback()
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
+    # Totals of the parties of the match changed
+    count_cache.invalidate(('match', match.id))
 
     response = {'members': [u.user.username for u in party.members]}
     return api_success(**response), 200
@@ -132,15 +132,14 @@ def join_party():
 
 @v1_parties.route('/leave', methods=['POST'])
 @login_required
-@check_required([('match', str)])
-def leave_party():
+@with_params(Param('match', str))
+def leave_party(params):
     """Leave current party for the match
 
     Params:
         match (str): Unique match slug
     """
-    received = request.get_json()
-    slug = received.get('match')
+    slug = params.match
 
     # Query match
     match = Match._by_slug(slug)
@@ -153,10 +152,7 @@ def leave_party():
 
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query participant record
@@ -207,23 +203,23 @@ def leave_party():
 
 
 @v1_parties.route('/kick', methods=['POST'])
-@check_required([('match', str), ('user', str)])
-def kick_member():
+@login_required
+@with_params(
+    Param('match', str),
+    Param('user', str),
+)
+def kick_member(params):
     """Kick a member from the party.
 
     Params:
         match (str): Unique slug of the match.
         user (str): Username of the user to kick.
     """
-    received = request.get_json()
-    slug = received.get('match')
-    username = received.get('user')
+    slug = params.match
+    username = params.user
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query match
@@ -318,15 +314,15 @@ def kick_member():
 
 
 @v1_parties.route('/disband', methods=['POST'])
-@check_required([('match', str)])
-def disband_party():
+@login_required
+@with_params(Param('match', str))
+def disband_party(params):
     """Disband a party.
 
     Params:
         match (str): Unique slug of the match.
     """
-    received = request.get_json()
-    slug = received.get('match')
+    slug = params.match
 
     # Query match
     match = Match._by_slug(slug)
@@ -339,10 +335,7 @@ def disband_party():
 
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query party
@@ -408,23 +401,28 @@ def disband_party():
             db.session.rollback()
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
+    # Totals of the parties of the match changed
+    count_cache.invalidate(('match', match.id))
 
     response = {'party-token': party_token}
     return api_success(**response), 200
 
 
 @v1_parties.route('/lfg', methods=['POST'])
-@check_required([('match', str), ('lfg', bool)])
-def set_lfg():
+@login_required
+@with_params(
+    Param('match', str),
+    Param('lfg', bool),
+)
+def set_lfg(params):
     """Set LFG visibility.
 
     Params:
         match (str): Unique slug of the match.
         lfg (bool): Whether the party is looking for members.
     """
-    received = request.get_json()
-    slug = received.get('match')
-    lfg = received.get('lfg')
+    slug = params.match
+    lfg = params.lfg
 
     # Query match
     match = Match._by_slug(slug)
@@ -437,10 +435,7 @@ def set_lfg():
 
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query party
@@ -470,34 +465,74 @@ def set_lfg():
             db.session.rollback()
             return api_error(m.RECORD_UPDATE_ERROR), 500
 
+    # Totals of the parties of the match changed
+    count_cache.invalidate(('match', match.id))
 
     return api_success(lfg=party.is_public), 200
 
 
+def _list_options(fields):
+    """Loader options of the lists of parties of the user.
+
+    The match is loaded from the join of the query, and the party with its
+    owner in the same statement. The members of all the parties of the page
+    (with their users) are loaded in a second query, so a page costs two
+    queries regardless of its size.
+
+    Args:
+        fields (list[str]): Fields of the matches to return.
+
+    Returns:
+        Tuple of loader options for a query of `MatchParticipant` joined
+        with `Match`.
+    """
+    return (
+        contains_eager(MatchParticipant.match)
+        .load_only(*Match._columns(fields)),
+        joinedload(MatchParticipant.party)
+        .joinedload(Party.owner)
+        .load_only(User.username),
+        joinedload(MatchParticipant.party)
+        .selectinload(Party.members)
+        .joinedload(MatchParticipant.user)
+        .load_only(User.username),
+    )
+
 @v1_parties.route('/list')
 @login_required
-@check_optional([('page', int)])
-def user_parties():
+@with_params(
+    Param('page', int, default=1),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(3)
+def user_parties(params):
     """List parties the logged in user is in.
 
     Params:
         page (int): Optional. Page number to return.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
+        fields (list[str]): Optional. Fields of the matches to return.
     """
-    received = request.get_json()
-    page = received.get('page', 1)
+    page = params.page
+    serializer = serializers.for_model(Match, params.fields)
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query parties
     per_page = current_app.config['MATCHES_PER_PAGE']
-    entries = (
+    query = (
         db.session
         .query(MatchParticipant)
+        .options(*_list_options(params.fields))
         .join(Match)
         .filter(
             MatchParticipant.user_id == user.id,
@@ -506,22 +541,19 @@ def user_parties():
             Match.is_deleted == False
         )
         .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
+    entries = pagination.paginate(query, page, per_page)
+
+    if params.with_total:
+        entries.total = util.query_total(query, ('user', user.id), 'parties')
+
     response = []
     for entry in entries.items:
         details = {}
 
         # Match details
-        match = entry.match
-
-        details['match'] = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+        details['match'] = serializer.object(entry.match)
 
         # Party details
         party = entry.party
@@ -534,33 +566,44 @@ def user_parties():
 
         response.append(details)
 
-    return api_success(**util.paginated(page, entries.pages, response)), 200
+    return api_success(**entries.as_dict(response)), 200
 
 
 @v1_parties.route('/list-past')
 @login_required
-@check_optional([('page', int)])
-def user_past_parties():
+@with_params(
+    Param('page', int, default=1),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(3)
+def user_past_parties(params):
     """List parties the logged in user has been in.
 
     Params:
         page (int): Optional. Page number to return.
+        with-total (bool): Optional. Include the total number of parties and
+            pages.
+        fields (list[str]): Optional. Fields of the matches to return.
     """
-    received = request.get_json()
-    page = received.get('page', 1)
+    page = params.page
+    serializer = serializers.for_model(Match, params.fields)
 
     # User record
-    user = util.user_from_jwt(received.get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
 
     # Query parties
     per_page = current_app.config['MATCHES_PER_PAGE']
-    entries = (
+    query = (
         db.session
         .query(MatchParticipant)
+        .options(*_list_options(params.fields))
         .join(Match)
         .filter(
             MatchParticipant.user_id == user.id,
@@ -569,22 +612,23 @@ def user_past_parties():
             Match.is_deleted == False
         )
         .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
+    entries = pagination.paginate(query, page, per_page)
+
+    if params.with_total:
+        entries.total = util.query_total(
+            query,
+            ('user', user.id),
+            'past-parties'
+        )
+
     response = []
     for entry in entries.items:
         details = {}
 
         # Match details
-        match = entry.match
-
-        details['match'] = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+        details['match'] = serializer.object(entry.match)
 
         # Party details
         party = entry.party
@@ -597,4 +641,4 @@ def user_past_parties():
 
         response.append(details)
 
-    return api_success(**util.paginated(page, entries.pages, response)), 200
+    return api_success(**entries.as_dict(response)), 200
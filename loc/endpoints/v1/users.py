@@ -27,10 +27,11 @@
 
 """/v1/users endpoints."""
 
-from flask import Blueprint, current_app, request
+from flask import Blueprint, current_app, g
 from loc import db
-from loc.helper import messages as m, util
-from loc.helper.deco import login_required, check_required, check_optional
+from loc.helper import messages as m, serializers, util
+from loc.helper.deco import login_required, query_budget, with_params
+from loc.helper.schema import Param
 from loc.helper.util import api_error, api_fail, api_success
 from loc.models import Follower, Match, MatchParticipant, User, Party
 
@@ -40,63 +41,93 @@ v1_users = Blueprint('v1_users', __name__)
 
 
 @v1_users.route('/profile')
-@check_required([('user', str)])
-def user_profile():
+@with_params(
+    Param('user', str),
+    Param('fields', list, default=tuple(User._fields), choices=User._fields),
+)
+@query_budget(1)
+def user_profile(params):
     """Obtain the profile of the specified user.
 
     Params:
         user (str): Username of the user to show.
+        fields (list[str]): Optional. Fields of the profile to return (all by
+            default).
     """
-    username = request.get_json().get('user')
+    username = params.user
+    fields = params.fields
 
-    user = User._by_username(username)
+    user = User._by_username(username, columns=User._columns(fields))
 
     if not user:
         return api_fail(user=m.USER_NOT_FOUND), 404
 
-    response = {
-        'username': user.username,
-        'name': user.name,
-    }
+    response = user.fields_dict(fields)
 
     return api_success(**response), 200
 
 
 @v1_users.route('/followers')
-@check_required([('user', str)])
-def user_followers():
+@with_params(
+    Param('user', str),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(2)
+def user_followers(params):
     """Obtain the users that follow the specified user.
 
     Params:
         user (str): Username of the user to show.
+        stream (str): Optional. Stream the users as a JSON array (`json`) or
+            as NDJSON (`ndjson`).
     """
-    username = request.get_json().get('user')
+    username = params.user
 
     user = User._by_username(username)
 
     if not user:
         return api_fail(user=m.USER_NOT_FOUND), 404
 
+    if params.stream:
+        return util.api_stream(
+            user.followers.with_entities(User.username),
+            lambda users: [f.username for f in users],
+            params.stream
+        )
+
     response = [f.username for f in user.followers]
 
     return api_success(followers=response), 200
 
 
 @v1_users.route('/following')
-@check_required([('user', str)])
-def user_following():
+@with_params(
+    Param('user', str),
+    Param('stream', str, default=None, choices=util.STREAM_FORMATS),
+)
+@query_budget(2)
+def user_following(params):
     """Obtain the users followed by the specified user.
 
     Params:
         user (str): Username of the user to show.
+        stream (str): Optional. Stream the users as a JSON array (`json`) or
+            as NDJSON (`ndjson`).
     """
-    username = request.get_json().get('user')
+    username = params.user
 
     user = User._by_username(username)
 
     if not user:
         return api_fail(user=m.USER_NOT_FOUND), 404
 
+    if params.stream:
+        return util.api_stream(
+            user.following.with_entities(User.username),
+            lambda users: [f.username for f in users],
+            params.stream
+        )
+
     response = [f.username for f in user.following]
 
     return api_success(followers=response), 200
@@ -104,23 +135,22 @@ def user_following():
 
 @v1_users.route('/follow', methods=['POST'])
 @login_required
-@check_required([('user', str), ('follow', bool)])
-def toggle_follow():
+@with_params(
+    Param('user', str),
+    Param('follow', bool),
+)
+def toggle_follow(params):
     """Toggle follow state of a user.
 
     Params:
         user (str): Username of the user to follow/unfollow.
         follow (bool): Flag indicating whether to follow or not.
     """
-    received = request.get_json()
-    username = received.get('user')
-    follow = received.get('follow')
+    username = params.user
+    follow = params.follow
 
     # User record
-    user = util.user_from_jwt(request.get_json().get('token'))
-
-    if not user:
-        return api_error(m.USER_NOT_FOUND), 404
+    user = g.user
 
     if username == user.username:
         return api_fail(user=m.CANNOT_FOLLOW_YOURSELF), 409
@@ -185,18 +215,33 @@ def toggle_follow():
 
 
 @v1_users.route('/matches')
-@check_required([('user', str)])
-@check_optional([('page', int)])
-def user_matches():
+@with_params(
+    Param('user', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(3)
+def user_matches(params):
     """List matches the logged in user is in.
 
     Params:
         user (str): Username to search
         page (int): Optional. Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of matches and
+            pages.
+        fields (list[str]): Optional. Fields of the matches to return.
     """
-    received = request.get_json()
-    username = received.get('user')
-    page = received.get('page', 1)
+    username = params.user
+    fields = params.fields
 
     user = User._by_username(username)
 
@@ -205,9 +250,10 @@ def user_matches():
 
     # Query matches
     per_page = current_app.config['MATCHES_PER_PAGE']
-    matches = (
-        db.session
-        .query(Match)
+    serializer = serializers.for_model(Match, fields)
+
+    query = (
+        serializer.query(db.session.query(Match))
         .join(MatchParticipant)
         .filter(
             MatchParticipant.user_id == user.id,
@@ -215,37 +261,55 @@ def user_matches():
             Match.is_visible == True,
             Match.is_deleted == False
         )
-        .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
-    for match in matches.items:
-        details = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+    try:
+        matches = util.MATCH_ORDER.paginate(
+            query,
+            params.page,
+            params.cursor,
+            per_page
+        )
+
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
+
+    if params.with_total:
+        matches.total = util.query_total(query, ('user', user.id), 'matches')
 
-        response.append(details)
+    response = serializer.rows(matches.items)
 
-    return api_success(**util.paginated(page, matches.pages, response)), 200
+    return api_success(**matches.as_dict(response)), 200
 
 
 @v1_users.route('/past-matches')
-@check_required([('user', str)])
-@check_optional([('page', int)])
-def user_past_matches():
+@with_params(
+    Param('user', str),
+    Param('page', int, default=1),
+    Param('cursor', str, default=None),
+    Param('with-total', bool, default=False),
+    Param(
+        'fields',
+        list,
+        default=Match._list_fields,
+        choices=Match._list_choices
+    ),
+)
+@query_budget(3)
+def user_past_matches(params):
     """List matches the logged in user is in.
 
     Params:
         user (str): Username to search
         page (int): Optional. Page number to return.
+        cursor (str): Optional. Cursor of the page to return (empty for the
+            first page), instead of the page number.
+        with-total (bool): Optional. Include the total number of matches and
+            pages.
+        fields (list[str]): Optional. Fields of the matches to return.
     """
-    received = request.get_json()
-    username = received.get('user')
-    page = received.get('page', 1)
+    username = params.user
+    fields = params.fields
 
     user = User._by_username(username)
 
@@ -254,9 +318,10 @@ def user_past_matches():
 
     # Query matches
     per_page = current_app.config['MATCHES_PER_PAGE']
-    matches = (
-        db.session
-        .query(Match)
+    serializer = serializers.for_model(Match, fields)
+
+    query = (
+        serializer.query(db.session.query(Match))
         .join(MatchParticipant)
         .filter(
             MatchParticipant.user_id == user.id,
@@ -264,19 +329,26 @@ def user_past_matches():
             Match.is_visible == True,
             Match.is_deleted == False
         )
-        .order_by(Match.start_date.asc())
-        .paginate(page, per_page, error_out=False)
     )
 
-    response = []
-    for match in matches.items:
-        details = {
-            'title': match.title,
-            'start-date': match.start_date.isoformat(),
-            'end-date': match.end_date.isoformat(),
-            'slug': match.slug
-        }
+    try:
+        matches = util.MATCH_ORDER.paginate(
+            query,
+            params.page,
+            params.cursor,
+            per_page
+        )
+
+    except ValueError:
+        return api_fail(cursor=m.INVALID_VALUE), 400
+
+    if params.with_total:
+        matches.total = util.query_total(
+            query,
+            ('user', user.id),
+            'past-matches'
+        )
 
-        response.append(details)
+    response = serializer.rows(matches.items)
 
-    return api_success(**util.paginated(page, matches.pages, response)), 200
+    return api_success(**matches.as_dict(response)), 200
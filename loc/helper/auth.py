@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Authentication helpers."""
+
+from flask import current_app, g
+from loc import db, revocations, token_cache
+from loc.helper import util
+from loc.models import Role, User, UserRole
+from sqlalchemy import event, inspect
+
+import datetime
+import hashlib
+import jwt
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class AuthUser(object):
+    """Compact snapshot of an authenticated user.
+
+    This is what gets stored in the token cache and in `flask.g.user`, so
+    that most requests do not need to load the full `User` record.
+
+    Attributes:
+        id (int): ID of the user record.
+        username (str): Unique username.
+        _jwt_counter (int): Counter to invalidate old tokens.
+        _roles_version (int): Version of the roles of the user.
+        is_deleted (bool): Whether the record has been (soft) deleted.
+        roles (frozenset): Names of the roles of the user, or `None` if they
+            have not been loaded (see `user_roles()`).
+    """
+    __slots__ = (
+        'id',
+        'username',
+        '_jwt_counter',
+        '_roles_version',
+        'is_deleted',
+        'roles'
+    )
+
+    def __init__(self, id, username, _jwt_counter, _roles_version, is_deleted,
+            roles=None):
+        self.id = id
+        self.username = username
+        self._jwt_counter = _jwt_counter
+        self._roles_version = _roles_version
+        self.is_deleted = is_deleted
+        self.roles = roles
+
+    @classmethod
+    def from_user(cls, user):
+        """Create a snapshot from a `User` record.
+
+        Roles are not loaded.
+
+        Args:
+            user (User): Record to use.
+        """
+        return cls(
+            user.id,
+            user.username,
+            user._jwt_counter,
+            user._roles_version,
+            user.is_deleted
+        )
+
+    @classmethod
+    def from_claims(cls, claims):
+        """Create a snapshot from the claims of a stateless access token.
+
+        Args:
+            claims (dict): Decoded access token.
+        """
+        return cls(
+            claims['sub'],
+            claims.get('username', ''),
+            claims.get('counter', -1),
+            claims.get('rv'),
+            False
+        )
+
+
+def current_user():
+    """Obtain the `User` record of the authenticated user.
+
+    Only needed when the view requires more than what is available in the
+    `AuthUser` snapshot (`flask.g.user`). The record is queried once per
+    request, and not at all if it was loaded to authenticate the user.
+
+    Returns:
+        `User` record if it exists, otherwise `None`.
+    """
+    if 'user_record' not in g:
+        g.user_record = User._by_id(g.user.id)
+
+    return g.user_record
+
+def encode_token(claims):
+    """Sign and encode a JWT token.
+
+    Args:
+        claims (dict): Claims to include in the token.
+
+    Returns:
+        Encoded token.
+    """
+    return jwt.encode(
+        claims,
+        current_app.config['SECRET_KEY'],
+        algorithm=current_app.config['JWT_ALGORITHM']
+    ).decode()
+
+def issue_access_token(user):
+    """Issue a short-lived stateless access token.
+
+    These tokens are verified only by signature and expiration (no database
+    access), so they contain everything needed to build an `AuthUser`,
+    including the roles of the user.
+    Their lifetime is set by the `JWT_ACCESS_EXPIRATION` setting (seconds).
+
+    Args:
+        user (User): Authenticated user.
+
+    Returns:
+        Encoded token.
+    """
+    expire = util.generate_expiration_date(
+        seconds=current_app.config['JWT_ACCESS_EXPIRATION']
+    )
+
+    return encode_token({
+        'sub': user.id,
+        'iat': datetime.datetime.utcnow(),
+        'exp': expire,
+        'type': 'access',
+        'username': user.username,
+        'counter': user._jwt_counter,
+        'roles': sorted(user.role_names),
+        'rv': user._roles_version
+    })
+
+def issue_token(user, remember=False, token_type=None):
+    """Issue a long-lived token checked against the JWT counter of the user.
+
+    Access tokens (no type) include the roles of the user and their version.
+
+    Args:
+        user (User): Authenticated user.
+        remember (bool): Whether the session should last for a year instead of
+            five days.
+        token_type (str): Optional. Type of the token (e.g. `'refresh'`).
+
+    Returns:
+        Encoded token.
+    """
+    if remember:
+        expire = util.generate_expiration_date(days=365)
+
+    else:
+        expire = util.generate_expiration_date(days=5)
+
+    claims = {
+        'sub': user.id,
+        'iat': datetime.datetime.utcnow(),
+        'exp': expire,
+        'counter': user._jwt_counter
+    }
+
+    if token_type:
+        claims['type'] = token_type
+
+    else:
+        claims['roles'] = sorted(user.role_names)
+        claims['rv'] = user._roles_version
+
+    return encode_token(claims)
+
+def invalidate_user(user_id, counter=None):
+    """Discard cached tokens of a user.
+
+    Must be called after incrementing `User._jwt_counter` or changing the
+    roles of the user (once the change has been committed). The revocation
+    is also broadcast to the rest of the workers.
+
+    Args:
+        user_id (int): ID of the user.
+        counter (int): Optional. New value of the JWT counter. If not
+            specified, all the cached tokens of the user are discarded, but
+            they are not revoked.
+    """
+    token_cache.evict_user(user_id, counter)
+
+    try:
+        revocations.publish(user_id, counter)
+
+    except Exception:
+        # Other workers will stop trusting the token once their cache expires
+        logger.exception('Could not publish the revocation of user %d', user_id)
+
+@event.listens_for(db.session, 'after_commit')
+def _roles_committed(session):
+    """Discard the cached tokens of the users whose roles were changed.
+
+    Users are recorded in the session by `loc.models._roles_changed()`.
+    """
+    for user in session.info.pop('roles_changed', ()):
+        # Identity is kept even if the instance was expired on commit
+        identity = inspect(user).identity
+
+        if identity is not None:
+            invalidate_user(identity[0])
+
+@event.listens_for(db.session, 'after_rollback')
+def _roles_rolled_back(session):
+    """Forget the role changes of a transaction that was rolled back."""
+    session.info.pop('roles_changed', None)
+
+def load_user(user_id):
+    """Load the snapshot of a (not deleted) user.
+
+    The record is kept for the rest of the request (see `current_user()`),
+    so views needing it do not query it again.
+
+    Args:
+        user_id (int): ID of the user.
+
+    Returns:
+        `AuthUser` instance, or `None` if the user does not exist.
+    """
+    user = User._by_id(user_id)
+
+    if not user:
+        return None
+
+    g.user_record = user
+
+    return AuthUser.from_user(user)
+
+def token_digest(token):
+    """Obtain the digest of an encoded token, used as cache key.
+
+    Args:
+        token (str): Encoded JWT token.
+    """
+    return hashlib.sha256(token.encode()).digest()
+
+def user_roles(user, claims):
+    """Obtain the role names of the authenticated user.
+
+    The roles included in the token are trusted unless the roles version of
+    the user changed since the token was issued, in which case they are
+    queried (once per cached snapshot).
+
+    Args:
+        user (AuthUser): Authenticated user.
+        claims (dict): Decoded token.
+
+    Returns:
+        Collection of role names.
+    """
+    if 'roles' in claims and claims.get('rv') == user._roles_version:
+        return claims['roles']
+
+    if user.roles is None:
+        user.roles = frozenset(
+            name for (name,) in (
+                db.session
+                .query(Role.name)
+                .join(UserRole, UserRole.role_id==Role.id)
+                .filter(UserRole.user_id==user.id)
+            )
+        )
+
+    return user.roles
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""In-process caches."""
+
+from collections import OrderedDict
+from threading import Lock
+
+import time
+
+
+class LRUCache(object):
+    """Thread-safe LRU cache with a per-entry time to live.
+
+    Expired entries are discarded lazily when they are accessed or when the
+    cache needs room for new entries.
+
+    Args:
+        maxsize (int): Maximum number of entries to keep. If `0`, nothing is
+            stored.
+        ttl (float): Default time to live (in seconds) of the entries.
+    """
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Obtain the value stored for a key.
+
+        Args:
+            key: Key to find.
+            default: Value returned if the key is not found or has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return default
+
+            value, expires = entry
+
+            if expires <= time.monotonic():
+                self._remove(key)
+                return default
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value.
+
+        Args:
+            key: Key of the entry.
+            value: Value to store.
+            ttl (float): Optional. Time to live for this entry, overrides the
+                default one.
+        """
+        if self.maxsize <= 0:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            while len(self._entries) >= self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._added(key, value)
+
+    def delete(self, key):
+        """Remove an entry from the cache (if it exists).
+
+        Args:
+            key: Key of the entry.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Remove all the entries."""
+        with self._lock:
+            while self._entries:
+                self._remove(next(iter(self._entries)))
+
+    def _added(self, key, value):
+        """Hook called (with the lock held) after an entry is stored."""
+        pass
+
+    def _remove(self, key):
+        """Remove an entry. Must be called with the lock held."""
+        value, _ = self._entries.pop(key)
+        return value
+
+
+class TokenCache(LRUCache):
+    """Cache of verified JWT tokens.
+
+    Keys are digests of the encoded tokens and values are `(claims, user)`
+    tuples, where `user` is a `loc.helper.auth.AuthUser` snapshot. Entries are
+    indexed by user so that they can be evicted when the tokens of a user are
+    invalidated.
+
+    The cache also remembers recent revocations for as long as stateless
+    access tokens last (`JWT_ACCESS_EXPIRATION` setting), since these tokens
+    are never checked against the database.
+
+    Configured through the `AUTH_CACHE_SIZE` and `AUTH_CACHE_TTL` settings.
+    """
+    def __init__(self, app=None):
+        super(TokenCache, self).__init__(0, 0)
+        self.revoked_ttl = 0
+        self._by_user = {}
+        self._revoked = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.maxsize = app.config.get('AUTH_CACHE_SIZE', 0)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', 0)
+
+        if app.config.get('JWT_STATELESS'):
+            self.revoked_ttl = app.config.get('JWT_ACCESS_EXPIRATION', 0)
+
+    def evict_user(self, user_id, counter=None):
+        """Remove all the cached tokens of a user.
+
+        Args:
+            user_id (int): ID of the user.
+            counter (int): Optional. If specified, only the entries whose
+                JWT counter is lower than this are removed.
+        """
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                _, user = self._entries[key][0]
+
+                if counter is None or user._jwt_counter < counter:
+                    self._remove(key)
+
+            if counter is None or self.revoked_ttl <= 0:
+                return
+
+            # Remember revocation, discarding those that are not needed
+            now = time.monotonic()
+            for revoked_id, (_, expires) in list(self._revoked.items()):
+                if expires <= now:
+                    del self._revoked[revoked_id]
+
+            previous = self._revoked.get(user_id, (counter, 0))[0]
+            self._revoked[user_id] = (
+                max(previous, counter),
+                now + self.revoked_ttl
+            )
+
+    def is_revoked(self, user_id, counter):
+        """Check if a token was revoked recently.
+
+        Args:
+            user_id (int): ID of the user the token belongs to.
+            counter (int): JWT counter included in the token.
+        """
+        with self._lock:
+            revoked = self._revoked.get(user_id)
+
+            if revoked is None or revoked[1] <= time.monotonic():
+                return False
+
+            return counter < revoked[0]
+
+    def _added(self, key, value):
+        _, user = value
+        self._by_user.setdefault(user.id, set()).add(key)
+
+    def _remove(self, key):
+        value = super(TokenCache, self)._remove(key)
+        _, user = value
+
+        keys = self._by_user.get(user.id)
+        if keys is not None:
+            keys.discard(key)
+
+            if not keys:
+                del self._by_user[user.id]
+
+        return value
+
+
+class ResponseCache(LRUCache):
+    """Cache of responses to public requests.
+
+    Values are `(status, mimetype, encoding, vary, body)` tuples, where `body`
+    is already compressed with `encoding` (if any), so cached pages are not
+    compressed again on every hit.
+
+    Configured through the `RESPONSE_CACHE_SIZE` and `RESPONSE_CACHE_TTL`
+    settings.
+    """
+    def __init__(self, app=None):
+        super(ResponseCache, self).__init__(0, 0)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.maxsize = app.config.get('RESPONSE_CACHE_SIZE', 0)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 0)
+
+
+class CountCache(LRUCache):
+    """Cache of the total number of records of lists.
+
+    Keys are `(tag, name, approximate)` tuples. Entries are indexed by tag
+    (e.g. `'matches'` or `('match', <id>)`), so that all the counts affected
+    by a write can be invalidated at once. Other workers rely on the (short)
+    time to live.
+
+    Configured through the `COUNT_CACHE_SIZE` and `COUNT_CACHE_TTL` settings.
+    """
+    def __init__(self, app=None):
+        super(CountCache, self).__init__(0, 0)
+        self._by_tag = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the cache from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.maxsize = app.config.get('COUNT_CACHE_SIZE', 0)
+        self.ttl = app.config.get('COUNT_CACHE_TTL', 0)
+
+    def invalidate(self, *tags):
+        """Remove the counts of the specified tags.
+
+        Args:
+            tags: Tags of the counts to remove.
+        """
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def _added(self, key, value):
+        self._by_tag.setdefault(key[0], set()).add(key)
+
+    def _remove(self, key):
+        value = super(CountCache, self)._remove(key)
+
+        keys = self._by_tag.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+
+            if not keys:
+                del self._by_tag[key[0]]
+
+        return value
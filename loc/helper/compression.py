@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Response compression.
+
+JSON responses are compressed with gzip or, if the `brotli` package is
+installed, brotli, depending on the `Accept-Encoding` header of the request.
+
+Configured through the following settings:
+    COMPRESS_ENABLED: whether to compress responses.
+    COMPRESS_MIN_SIZE: minimum size (in bytes) of the responses to compress.
+    COMPRESS_LEVEL: gzip compression level (1-9).
+    COMPRESS_BROTLI_QUALITY: brotli quality (0-11).
+"""
+
+from flask import request
+
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Compressible mimetypes
+MIMETYPES = frozenset((
+    'application/json',
+    'application/x-ndjson',
+    'application/msgpack',
+    'application/cbor'
+))
+
+
+class Compression(object):
+    """Compress responses after each request.
+
+    Args:
+        app (Flask): Application instance.
+    """
+    def __init__(self, app=None):
+        self.enabled = False
+        self.min_size = 0
+        self.level = 6
+        self.brotli_quality = 4
+        self.encodings = ('gzip',)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure compression from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.level = app.config.get('COMPRESS_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+
+        # Preferred encodings first
+        if brotli is not None:
+            self.encodings = ('br', 'gzip')
+
+        app.after_request(self.after_request)
+
+    def compress(self, body, encoding):
+        """Compress a body.
+
+        Args:
+            body (bytes): Data to compress.
+            encoding (str): `gzip` or `br`.
+
+        Returns:
+            Compressed data.
+        """
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+
+        # Fixed mtime so that the same body is always compressed the same
+        return gzip.compress(body, self.level, mtime=0)
+
+    def negotiate(self):
+        """Choose the encoding of the response to the current request.
+
+        Returns:
+            Name of the encoding or `None` if the response should not be
+            compressed.
+        """
+        if not self.enabled:
+            return None
+
+        accepted = request.accept_encodings
+
+        for encoding in self.encodings:
+            if accepted.quality(encoding) > 0:
+                return encoding
+
+        return None
+
+    def compress_response(self, response, encoding):
+        """Compress a response in place, if it is worth it.
+
+        Args:
+            response (Response): Response to compress.
+            encoding (str): Encoding to use (or `None`).
+
+        Returns:
+            Encoding applied to the response, or `None` if it was not
+            compressed.
+        """
+        if response.mimetype not in MIMETYPES:
+            return None
+
+        # Vary even if not compressed, so that caches do not mix responses
+        response.vary.add('Accept-Encoding')
+
+        if (encoding is None
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return None
+
+        body = response.get_data()
+
+        if len(body) < self.min_size:
+            return None
+
+        response.set_data(self.compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+        return encoding
+
+    def after_request(self, response):
+        """Compress the response of the current request."""
+        if 'Content-Encoding' not in response.headers:
+            self.compress_response(response, self.negotiate())
+
+        return response
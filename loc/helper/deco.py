@@ -27,51 +27,87 @@
 
 """Decorator functions."""
 
-from flask import current_app, jsonify, request
+from flask import current_app, g, request
 from functools import wraps
-from werkzeug.exceptions import BadRequest
 
-from loc.helper import util
+from loc import (
+    compression,
+    json_encoder,
+    query_stats,
+    rate_limiter,
+    response_cache,
+    revocations,
+    token_cache
+)
+from loc.helper import auth, i18n, util
 from loc.helper import messages as m
-from loc.models import Role, User, UserRole
+from loc.helper.schema import Schema
 
 import jwt
+import math
+import time
 
 
-def login_required(f):
-    """Require a JWT token to access the decorated view.
+def _authenticate():
+    """Decode the JWT token of the request and load the authenticated user.
 
-    In case the token received is not valid, the request is aborted with a
-    401 HTTP status code.
+    The decoded claims and the `loc.helper.auth.AuthUser` snapshot of the
+    user are stored in `flask.g` (as `jwt` and `user` respectively) so that
+    the view does not need to decode the token or query the user again.
+
+    Verified tokens are kept in the token cache, so repeated requests with the
+    same token do not decode it or query the user.
+
+    Returns:
+        `None` if the user was authenticated, otherwise the error response
+        (with status code) to return.
     """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        try:
-            jwt_token = request.get_json().get('token')
+    jwt_token = util.request_token()
+
+    if not jwt_token:
+        return util.api_fail(token=m.JWT_MISSING), 401
+
+    if not isinstance(jwt_token, str):
+        # Sent in a JSON body as a number, list...
+        return util.api_fail(token=m.JWT_ERROR), 401
+
+    # Check verified tokens first (dropping those revoked by other workers)
+    revocations.sync()
 
-        except BadRequest as e:
-            # TODO log except
-            return util.api_error(m.JWT_MISSING), 500
+    digest = auth.token_digest(jwt_token)
+    cached = token_cache.get(digest)
 
-        if not jwt_token:
-            return util.api_fail(token=m.JWT_MISSING), 401
+    if cached:
+        g.jwt, g.user = cached
+        return None
 
-        # Decode
-        try:
-            decoded = jwt.decode(jwt_token, current_app.config['SECRET_KEY'])
+    # Decode
+    try:
+        decoded = jwt.decode(jwt_token, current_app.config['SECRET_KEY'])
 
-        except jwt.exceptions.DecodeError:
-            # TODO log
-            return util.api_error(m.JWT_ERROR), 500
+    except jwt.exceptions.DecodeError:
+        # TODO log
+        return util.api_error(m.JWT_ERROR), 500
 
-        except jwt.ExpiredSignatureError:
+    except jwt.ExpiredSignatureError:
+        return util.api_error(m.JWT_EXPIRED), 401
+
+    token_type = decoded.get('type')
+
+    if token_type == 'access':
+        # Stateless token, the user is not queried
+        user = auth.AuthUser.from_claims(decoded)
+
+        if token_cache.is_revoked(user.id, user._jwt_counter):
             return util.api_error(m.JWT_EXPIRED), 401
 
-        # Get user
-        user = User.query.filter_by(
-            id=decoded.get('sub', -1),
-            is_deleted=False
-        ).first()
+    elif token_type:
+        # Refresh tokens cannot be used to access the API
+        return util.api_error(m.JWT_ERROR), 401
+
+    else:
+        # Get user (the record is kept in `g.user_record` for the view)
+        user = auth.load_user(decoded.get('sub', -1))
 
         if not user:
             return util.api_error(m.USER_NOT_FOUND), 401
@@ -80,6 +116,32 @@ def login_required(f):
         if decoded.get('counter', -1) != user._jwt_counter:
             return util.api_error(m.JWT_EXPIRED), 401
 
+    # Do not keep the token cached past its expiration
+    ttl = token_cache.ttl
+    if 'exp' in decoded:
+        ttl = min(ttl, decoded['exp'] - time.time())
+
+    token_cache.set(digest, (decoded, user), ttl)
+
+    g.jwt = decoded
+    g.user = user
+
+    return None
+
+def login_required(f):
+    """Require a JWT token to access the decorated view.
+
+    In case the token received is not valid, the request is aborted with a
+    401 HTTP status code. Otherwise, the authenticated user is available in
+    `flask.g.user`.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        error = _authenticate()
+
+        if error:
+            return error
+
         return f(*args, **kwargs)
 
     return decorated_function
@@ -89,6 +151,7 @@ def role_required(role):
 
     In case the token received is not valid, or hte user does not have the
     required role, the request is aborted with a 401 HTTP status code.
+    Otherwise, the authenticated user is available in `flask.g.user`.
 
     Args:
         role (str): Name of the required role
@@ -96,97 +159,169 @@ def role_required(role):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            try:
-                jwt_token = request.get_json().get('token')
+            error = _authenticate()
+
+            if error:
+                return error
+
+            # Check role
+            roles = auth.user_roles(g.user, g.jwt)
 
-            except BadRequest as e:
-                # TODO log except
-                return util.api_error(m.JWT_MISSING), 500
+            if role not in roles:
+                return util.api_error(m.ROLE_MISSING), 401
 
-            if not jwt_token:
-                return util.api_fail(token=m.JWT_MISSING), 401
+            return f(*args, **kwargs)
 
-            # Decode
-            try:
-                decoded = jwt.decode(jwt_token, current_app.config['SECRET_KEY'])
+        return decorated_function
 
-            except jwt.exceptions.DecodeError:
-                # TODO log
-                return util.api_error(m.JWT_ERROR), 500
+    return decorator
 
-            except jwt.ExpiredSignatureError:
-                return util.api_error(m.JWT_EXPIRED), 401
 
-            # Get user
-            user = User.query.filter_by(
-                id=decoded.get('sub', -1),
-                is_deleted=False
-            ).first()
+def cached_response(f):
+    """Cache the responses of the decorated (public) view.
 
-            if not user:
-                return util.api_error(m.USER_NOT_FOUND), 401
+    Responses are cached by path, parameters, locale, negotiated format and
+    encoding, already compressed, so hits do not run the view nor compress the body
+    again. Only successful, non-streamed responses are cached, for
+    `RESPONSE_CACHE_TTL` seconds.
 
-            # Token was invalidated?
-            if decoded.get('counter', -1) != user._jwt_counter:
-                return util.api_error(m.JWT_EXPIRED), 401
+    Only the parameters declared with `with_params()` are part of the key,
+    once validated, so this decorator must be placed above it.
+    """
+    schema = getattr(f, 'schema', None)
 
-            # Check role
-            user_role = (
-                UserRole
-                .query
-                .join(Role, UserRole.role_id==Role.id)
-                .filter(UserRole.user_id==user.id)
-                .filter(Role.name==role)
-            ).first()
-
-            if not user_role:
-                return util.api_error(m.ROLE_MISSING), 401
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        encoding = compression.negotiate()
 
-            return f(*args, **kwargs)
+        values = ()
+        if schema is not None:
+            validated, errors = schema.validate(
+                util.request_params(),
+                g.query_params
+            )
+
+            if errors:
+                return f(*args, **kwargs)
+
+            # Reused by `with_params()`
+            g.validated_params = (schema, validated)
+
+            values = tuple(
+                tuple(v) if isinstance(v, list) else v
+                for v in (getattr(validated, p.attr) for p in schema.params)
+            )
+
+        key = (
+            request.path,
+            values,
+            i18n.current_locale(),
+            json_encoder.negotiate().mimetype,
+            encoding
+        )
+
+        cached = response_cache.get(key)
+
+        if cached:
+            status, mimetype, content_encoding, vary, body = cached
+
+            response = current_app.response_class(
+                body,
+                status=status,
+                mimetype=mimetype
+            )
+            response.vary.update(vary)
+
+            if content_encoding:
+                response.headers['Content-Encoding'] = content_encoding
+
+            return response
+
+        response = current_app.make_response(f(*args, **kwargs))
+
+        if response.status_code == 200 and not response.is_streamed:
+            content_encoding = compression.compress_response(response, encoding)
+
+            response_cache.set(key, (
+                response.status_code,
+                response.mimetype,
+                content_encoding,
+                tuple(response.vary),
+                response.get_data()
+            ))
+
+        return response
+
+    return decorated_function
+
+def query_budget(budget):
+    """Declare the maximum number of statements issued by the decorated view.
+
+    Only the statements of the view itself are counted (not those needed to
+    authenticate the user), so this decorator must be the closest to the
+    view. Exceeding the budget is logged or, if `QUERY_BUDGET_STRICT` is
+    set, raises `loc.helper.instrumentation.QueryBudgetExceeded`.
+
+    The budget is also available in the `query_budget` attribute of the view.
+
+    Args:
+        budget (int): Maximum number of statements.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            stats = query_stats.current()
+
+            if stats is None:
+                return f(*args, **kwargs)
+
+            start = stats.count
+            result = f(*args, **kwargs)
+
+            query_stats.check_budget(stats.count - start, budget)
+
+            return result
+
+        decorated_function.query_budget = budget
 
         return decorated_function
 
     return decorator
 
+def rate_limit(name, param=None):
+    """Limit the rate of requests to the decorated view.
 
-def check_required(params):
-    """Check that the specified parameters are provided and valid.
+    Requests are keyed by the IP address of the client (see
+    `loc.helper.util.client_address()`) or, if `param` is specified, by the
+    value of that parameter. In case the limit is exceeded,
+    the request is aborted with a 429 HTTP status code.
 
     Args:
-        params (list[tuple]): List of tuples containing the parameter name
-            and the data type that the parameter should be.
+        name (str): Name of the limit in the `RATELIMITS` setting.
+        param (str): Optional. Name of the parameter to key requests by.
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            json = request.get_json()
+            if param:
+                value = util.request_params().get(param)
 
-            # Check if JSON was provided
-            if not json:
-                response = {}
-                for p in params:
-                    response[p[0]] = m.FIELD_MISSING
+                # Will be rejected when checking the parameters
+                if not isinstance(value, str):
+                    return f(*args, **kwargs)
 
-                return util.api_fail(**response), 400
+                value = value.strip().lower()
 
-            # Check for missing fields and wrong data types
-            errors = {}
-            for p in params:
-                name = p[0]
-                p_type = p[1]
+            else:
+                value = util.client_address()
 
-                # Missing field
-                if name not in json.keys():
-                    errors[name] = m.FIELD_MISSING
-                    continue
+            retry_after = rate_limiter.hit(name, value)
 
-                # Wrong data type
-                if not isinstance(json[name], p_type):
-                    errors[name] = m.INVALID_TYPE
+            if retry_after is not None:
+                response = util.api_error(m.TOO_MANY_REQUESTS)
+                response.headers['Retry-After'] = str(math.ceil(retry_after))
 
-            # Return errors if any
-            if errors:
-                return util.api_fail(**errors), 400
+                return response, 429
 
             return f(*args, **kwargs)
 
@@ -194,46 +329,49 @@ def check_required(params):
 
     return decorator
 
-def check_optional(params):
-    """Check that the specified parameters are valid.
 
-    This is for optional parameters that may not appear in the request, so
-    they will only be checked if present.
+def with_params(*params):
+    """Validate the parameters of the request with a declarative schema.
+
+    The schema is compiled when decorating the view. Validated parameters
+    (converted to the expected types and with defaults applied) are passed
+    to the view in the `params` keyword argument. In case of errors, the
+    request is aborted with a 400 HTTP status code.
+
+    Parameters can be received in the JSON body or, for GET requests, in the
+    query string.
+
+    The schema is available in the `schema` attribute of the decorated view
+    (see `cached_response()`).
 
     Args:
-        params (list[tuple]): List of tuples containing the parameter name
-            and the data type that the parameter should be.
+        params (list[loc.helper.schema.Param]): Parameters of the request.
     """
+    schema = Schema(params)
+
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            json = request.get_json()
+            # Already validated by `cached_response()`?
+            cached = g.pop('validated_params', None)
 
-            # Check if JSON was provided
-            if not json:
-                # Nothing to do
-                return f(*args, **kwargs)
+            if cached is not None and cached[0] is schema:
+                validated = cached[1]
 
-            # Check for missing fields and wrong data types
-            errors = {}
-            for p in params:
-                name = p[0]
-                p_type = p[1]
+            else:
+                received = util.request_params()
 
-                # Missing field, skip it
-                if name not in json.keys():
-                    continue
+                validated, errors = schema.validate(received, g.query_params)
 
-                # Wrong data type
-                if not isinstance(json[name], p_type):
-                    errors[name] = m.INVALID_TYPE
+                if errors:
+                    return util.api_fail(**errors), 400
 
-            # Return errors if any
-            if errors:
-                return util.api_fail(**errors), 400
+            kwargs['params'] = validated
 
             return f(*args, **kwargs)
 
+        decorated_function.schema = schema
+
         return decorated_function
 
     return decorator
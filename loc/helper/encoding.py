@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Encoding of API responses.
+
+`flask.jsonify()` copies the response, sorts its keys and pretty-prints it
+with the stdlib encoder. Responses are instead encoded by a `JSONEncoder`
+using one of the following backends (`JSON_ENCODER` setting):
+    auto: `orjson` if installed, otherwise `stdlib`.
+    orjson: the `orjson` package.
+    stdlib: compact `json.JSONEncoder` without circular reference checks.
+
+Dates are encoded in ISO 8601 format by every backend and translated
+messages (lazy strings) are resolved. Set `JSON_PRETTYPRINT` to indent the
+output (slower).
+
+Clients may also request binary formats with the `Accept` header, among
+those listed in the `RESPONSE_FORMATS` setting:
+    msgpack: MessagePack (`application/msgpack`), requires `msgpack`.
+    cbor: CBOR (`application/cbor`), requires `cbor2`.
+
+The structure of the responses is the same in every format.
+"""
+
+from flask import current_app, request
+from flask_babel.speaklater import LazyString
+
+import datetime
+import json
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_MIMETYPE = 'application/json'
+
+
+def _default(o):
+    """Encode the types not supported natively by the backends."""
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return o.isoformat()
+
+    if isinstance(o, LazyString):
+        return str(o)
+
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+
+    raise TypeError('%r is not JSON serializable' % o)
+
+def _cbor_default(encoder, o):
+    """Encode the types not supported natively by `cbor2`."""
+    encoder.encode(_default(o))
+
+def _cbor_date(encoder, o):
+    """Encode dates as strings, as in JSON (instead of tagged values)."""
+    encoder.encode(o.isoformat())
+
+
+class StdlibBackend(object):
+    """Encoder based on `json.JSONEncoder`."""
+    mimetype = JSON_MIMETYPE
+
+    def __init__(self, pretty=False):
+        if pretty:
+            self._encoder = json.JSONEncoder(
+                indent=2,
+                ensure_ascii=False,
+                default=_default
+            )
+
+        else:
+            self._encoder = json.JSONEncoder(
+                separators=(',', ':'),
+                ensure_ascii=False,
+                check_circular=False,
+                default=_default
+            )
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode('utf-8')
+
+
+class OrjsonBackend(object):
+    """Encoder based on `orjson`."""
+    mimetype = JSON_MIMETYPE
+
+    def __init__(self, pretty=False):
+        if orjson is None:
+            raise RuntimeError('The orjson package is required for this backend')
+
+        self._option = orjson.OPT_INDENT_2 if pretty else 0
+
+    def dumps(self, obj):
+        return orjson.dumps(obj, default=_default, option=self._option)
+
+
+class MsgpackBackend(object):
+    """MessagePack encoder based on `msgpack`."""
+    mimetype = 'application/msgpack'
+    aliases = ('application/x-msgpack',)
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError('The msgpack package is required for this backend')
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+class CBORBackend(object):
+    """CBOR encoder based on `cbor2`."""
+    mimetype = 'application/cbor'
+    aliases = ()
+
+    def __init__(self):
+        if cbor2 is None:
+            raise RuntimeError('The cbor2 package is required for this backend')
+
+        self._encoders = {
+            datetime.datetime: _cbor_date,
+            datetime.date: _cbor_date
+        }
+
+    def dumps(self, obj):
+        return cbor2.dumps(obj, default=_cbor_default, encoders=self._encoders)
+
+
+# Binary formats and the packages they require
+BINARY_BACKENDS = {
+    'msgpack': (MsgpackBackend, msgpack),
+    'cbor': (CBORBackend, cbor2)
+}
+
+
+class JSONEncoder(object):
+    """Encode API responses.
+
+    Responses are encoded in JSON unless the client accepts one of the
+    binary formats enabled.
+
+    Responses that only contain translated messages (e.g. most errors) are
+    constant: they are encoded once per language and format and reused.
+
+    Args:
+        app (Flask): Application instance.
+    """
+    def __init__(self, app=None):
+        self.backend = None
+        self._backends = {}
+        self._mimetypes = []
+        self._constants = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the backend from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        backend = app.config.get('JSON_ENCODER', 'auto')
+        pretty = app.config.get('JSON_PRETTYPRINT', False)
+
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'stdlib'
+
+        if backend == 'orjson':
+            self.backend = OrjsonBackend(pretty)
+
+        elif backend == 'stdlib':
+            self.backend = StdlibBackend(pretty)
+
+        else:
+            raise ValueError('Unknown JSON encoder: %s' % backend)
+
+        # Formats to negotiate (JSON first, as it is the default)
+        self._backends = {JSON_MIMETYPE: self.backend}
+        self._mimetypes = [JSON_MIMETYPE]
+
+        for name in app.config.get('RESPONSE_FORMATS', ['json']):
+            if name == 'json':
+                continue
+
+            if name not in BINARY_BACKENDS:
+                raise ValueError('Unknown response format: %s' % name)
+
+            backend_class, package = BINARY_BACKENDS[name]
+
+            # Skip formats whose package is not installed
+            if package is None:
+                continue
+
+            backend = backend_class()
+
+            for mimetype in (backend.mimetype,) + backend.aliases:
+                self._backends[mimetype] = backend
+                self._mimetypes.append(mimetype)
+
+    def negotiate(self):
+        """Choose the encoder of the response from the `Accept` header.
+
+        Returns:
+            Backend used to encode the response.
+        """
+        if len(self._mimetypes) == 1 or 'Accept' not in request.headers:
+            return self.backend
+
+        mimetype = request.accept_mimetypes.best_match(
+            self._mimetypes,
+            JSON_MIMETYPE
+        )
+
+        return self._backends[mimetype]
+
+    def dumps(self, obj):
+        """Encode an object.
+
+        Returns:
+            UTF-8 encoded JSON document.
+        """
+        return self.backend.dumps(obj)
+
+    def response(self, obj, key=None):
+        """Create a response in the format accepted by the client.
+
+        Args:
+            obj: Object to encode.
+            key (tuple): Optional. Key identifying a constant response,
+                including the resolved translations. If specified, the
+                encoded response is cached.
+
+        Returns:
+            `Response` instance.
+        """
+        backend = self.negotiate()
+
+        if key is None:
+            body = backend.dumps(obj)
+
+        else:
+            key = (backend.mimetype, key)
+            body = self._constants.get(key)
+
+            if body is None:
+                body = backend.dumps(obj)
+                self._constants[key] = body
+
+        response = current_app.response_class(body, mimetype=backend.mimetype)
+
+        if len(self._mimetypes) > 1:
+            response.vary.add('Accept')
+
+        return response
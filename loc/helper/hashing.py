@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Bounded process pool for bcrypt operations.
+
+bcrypt is CPU-bound and intentionally slow, so running it in the request
+threads lets a burst of logins or signups stall every other endpoint. Instead,
+hashes are computed in a pool of processes with a bounded number of pending
+operations. When the pool is full, `BcryptBusy` is raised so that the request
+fails fast with a 503 status code.
+
+Every application process (e.g. each gunicorn worker) has its own pool, so
+the server runs up to `workers * BCRYPT_WORKERS` bcrypt processes in total.
+
+Configured through the following settings:
+    BCRYPT_WORKERS: number of processes of each application process (`0`
+        runs bcrypt in the calling thread, still bounded by the queue size).
+    BCRYPT_QUEUE_SIZE: maximum number of operations waiting for a process.
+    BCRYPT_RETRY_AFTER: seconds sent in the `Retry-After` header.
+    BCRYPT_STATS_INTERVAL: minimum seconds between logs of the statistics of
+        the queue (`0` disables them).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+import bcrypt
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class BcryptBusy(Exception):
+    """Raised when there is no room in the bcrypt queue.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+    def __init__(self, retry_after):
+        super(BcryptBusy, self).__init__('bcrypt queue is full')
+        self.retry_after = retry_after
+
+
+def _timed(f, *args):
+    """Run a function, also returning when it started (runs in the pool)."""
+    return time.monotonic(), f(*args)
+
+
+class BcryptExecutor(object):
+    """Run bcrypt operations in a bounded process pool.
+
+    The pool is created lazily in each process, so that it is not shared
+    between forked workers.
+
+    Args:
+        app (Flask): Application instance.
+    """
+    def __init__(self, app=None):
+        self.workers = 0
+        self.queue_size = 0
+        self.retry_after = 1
+        self.stats_interval = 0
+
+        self._pool = None
+        self._pid = None
+        self._slots = None
+        self._lock = Lock()
+
+        # Statistics
+        self._depth = 0
+        self._count = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._next_stats = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the executor from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.workers = app.config.get('BCRYPT_WORKERS', 2)
+        self.queue_size = app.config.get('BCRYPT_QUEUE_SIZE', 64)
+        self.retry_after = app.config.get('BCRYPT_RETRY_AFTER', 1)
+        self.stats_interval = app.config.get('BCRYPT_STATS_INTERVAL', 300)
+
+        self._slots = BoundedSemaphore(max(self.workers, 1) + self.queue_size)
+
+    def checkpw(self, password, hashed):
+        """Check a password against a hash.
+
+        Args:
+            password (bytes): Original password.
+            hashed (bytes): Hashed password.
+
+        Returns:
+            `True` or `False`
+        """
+        return self.run(bcrypt.checkpw, password, hashed)
+
+    def hashpw(self, password, rounds):
+        """Hash a password.
+
+        Args:
+            password (bytes): Plaintext password.
+            rounds (int): bcrypt cost factor.
+
+        Returns:
+            Hashed password (bytes).
+        """
+        return self.run(bcrypt.hashpw, password, bcrypt.gensalt(rounds=rounds))
+
+    def run(self, f, *args):
+        """Run a bcrypt function in the pool.
+
+        Args:
+            f (callable): Function to call (must be picklable).
+
+        Returns:
+            Result of the function.
+
+        Raises:
+            BcryptBusy: The queue is full.
+        """
+        if not self._slots.acquire(False):
+            logger.warning('bcrypt queue is full: %s', self._format_stats())
+            raise BcryptBusy(self.retry_after)
+
+        with self._lock:
+            self._depth += 1
+
+        try:
+            submitted = time.monotonic()
+
+            if self.workers > 0:
+                started, result = self._run_in_pool(f, *args)
+
+            else:
+                started, result = _timed(f, *args)
+
+            wait = max(started - submitted, 0.0)
+
+        finally:
+            with self._lock:
+                self._depth -= 1
+
+            self._slots.release()
+
+        with self._lock:
+            self._count += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+            now = time.monotonic()
+            log_stats = self.stats_interval > 0 and now >= self._next_stats
+
+            if log_stats:
+                self._next_stats = now + self.stats_interval
+
+        logger.debug(
+            'bcrypt waited %.3fs in queue (depth %d)',
+            wait,
+            self._depth
+        )
+
+        if log_stats:
+            logger.info('bcrypt queue: %s', self._format_stats())
+
+        return result
+
+    def stats(self):
+        """Obtain statistics of the executor in the current process.
+
+        Returns:
+            dict with the current queue depth and the number of operations
+            run, as well as the average and maximum time (in seconds) they
+            waited in the queue.
+        """
+        with self._lock:
+            return {
+                'depth': self._depth,
+                'count': self._count,
+                'avg-wait': self._total_wait / self._count if self._count else 0,
+                'max-wait': self._max_wait
+            }
+
+    def _format_stats(self):
+        """Format the statistics of the executor for the log."""
+        stats = self.stats()
+
+        return (
+            '%(depth)d operations in queue, %(count)d run, '
+            'waited %(avg-wait).3fs on average (max %(max-wait).3fs)' % stats
+        )
+
+    def _run_in_pool(self, f, *args):
+        """Run a function in the pool, (re)creating it if needed."""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers)
+                self._pid = os.getpid()
+
+            pool = self._pool
+
+        try:
+            return pool.submit(_timed, f, *args).result()
+
+        except BrokenProcessPool:
+            # Create a new pool for the next operation
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+
+            raise
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Localization of status messages and mails.
+
+Messages are declared with `message()` (instead of `lazy_gettext()`) and are
+resolved at startup into an immutable table per supported locale (the
+`LANGUAGES` setting), so converting a message to a string during a request is
+a dict lookup instead of a gettext call.
+
+The locale of each request is chosen from the `lang` parameter (explicit
+preference of the client) or the `Accept-Language` header, falling back to
+`BABEL_DEFAULT_LOCALE`.
+"""
+
+from flask import current_app, g, has_request_context, request
+from flask_babel import force_locale, gettext
+from flask_babel.speaklater import LazyString
+from types import MappingProxyType
+
+
+# Every declared message
+_messages = []
+
+# Resolved messages by locale: {locale: {msgid: message}}
+_tables = {}
+
+
+class Message(LazyString):
+    """Translatable message resolved through the per-locale tables.
+
+    Args:
+        msgid (str): Message in the default language.
+    """
+    def __init__(self, msgid):
+        super(Message, self).__init__(gettext, msgid)
+        self.msgid = msgid
+
+    def __str__(self):
+        table = _tables.get(current_locale())
+
+        if table is not None and self.msgid in table:
+            return table[self.msgid]
+
+        return super(Message, self).__str__()
+
+
+def message(msgid):
+    """Declare a translatable message.
+
+    Args:
+        msgid (str): Message in the default language.
+
+    Returns:
+        `Message` instance.
+    """
+    m = Message(msgid)
+    _messages.append(m)
+
+    return m
+
+def current_locale():
+    """Obtain the locale of the current request.
+
+    Returns:
+        Locale name, or the default locale outside of requests.
+    """
+    if not has_request_context():
+        return current_app.config.get('BABEL_DEFAULT_LOCALE', 'en')
+
+    locale = g.get('locale')
+
+    if locale is None:
+        locale = g.locale = _select_locale()
+
+    return locale
+
+def _select_locale():
+    """Choose the locale of the current request."""
+    languages = current_app.config['LANGUAGES']
+    default = current_app.config.get('BABEL_DEFAULT_LOCALE', 'en')
+
+    # Imported here to avoid circular imports
+    from loc.helper.util import request_params
+
+    lang = request_params().get('lang')
+
+    if isinstance(lang, str) and lang in languages:
+        return lang
+
+    return request.accept_languages.best_match(languages, default)
+
+
+class MessageCatalogs(object):
+    """Resolve the messages for each locale and select the request locale.
+
+    Args:
+        app (Flask): Application instance.
+        babel (Babel): Flask-Babel instance.
+    """
+    def __init__(self, app=None, babel=None):
+        if app is not None:
+            self.init_app(app, babel)
+
+    def init_app(self, app, babel):
+        """Register the locale selector and build the message tables.
+
+        Args:
+            app (Flask): Application instance.
+            babel (Babel): Flask-Babel instance.
+        """
+        babel.localeselector(current_locale)
+        app.after_request(self.after_request)
+
+        # Load declared messages
+        from loc.helper import mails, messages
+
+        with app.test_request_context():
+            for locale in app.config['LANGUAGES']:
+                with force_locale(locale):
+                    table = {m.msgid: gettext(m.msgid) for m in _messages}
+
+                _tables[locale] = MappingProxyType(table)
+
+    def after_request(self, response):
+        """Responses depend on the language requested."""
+        response.vary.add('Accept-Language')
+
+        return response
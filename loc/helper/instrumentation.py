@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Per-request SQL instrumentation.
+
+Statements executed while handling a request are recorded through
+SQLAlchemy engine events: their number, the total time spent in the
+database and the slowest statement. The totals are logged after each request
+and, optionally, sent in debug response headers:
+    X-Query-Count: number of statements.
+    X-Query-Time: total database time (milliseconds).
+
+Views can declare the maximum number of statements they may issue with the
+`loc.helper.deco.query_budget()` decorator. Exceeding a budget is logged or,
+in strict mode (meant for tests), raises `QueryBudgetExceeded`.
+
+Statements issued while a streamed response is sent are not included.
+
+Configured through the following settings:
+    QUERY_STATS_ENABLED: whether to record statements.
+    QUERY_STATS_HEADERS: whether to send the totals in response headers.
+    QUERY_STATS_SLOW_TIME: statements taking at least these seconds are
+        logged as warnings.
+    QUERY_BUDGET_STRICT: whether to raise `QueryBudgetExceeded` when a view
+        exceeds its budget.
+"""
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view issues more statements than its budget (strict mode).
+
+    Attributes:
+        endpoint (str): Endpoint of the view.
+        count (int): Statements issued by the view.
+        budget (int): Statements allowed.
+    """
+    def __init__(self, endpoint, count, budget):
+        super(QueryBudgetExceeded, self).__init__(
+            '%s issued %d statements (budget: %d)' % (endpoint, count, budget)
+        )
+        self.endpoint = endpoint
+        self.count = count
+        self.budget = budget
+
+
+class RequestStats(object):
+    """Statements executed during a request.
+
+    Attributes:
+        count (int): Number of statements.
+        time (float): Total time spent in the database (seconds).
+        slowest (str): Slowest statement (`None` if there were none).
+        slowest_time (float): Time of the slowest statement (seconds).
+    """
+    __slots__ = ('count', 'time', 'slowest', 'slowest_time')
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.slowest = None
+        self.slowest_time = 0.0
+
+    def record(self, statement, elapsed):
+        """Record an executed statement.
+
+        Args:
+            statement (str): SQL of the statement.
+            elapsed (float): Execution time (seconds).
+        """
+        self.count += 1
+        self.time += elapsed
+
+        if self.slowest is None or elapsed > self.slowest_time:
+            self.slowest = statement
+            self.slowest_time = elapsed
+
+
+def _current_stats():
+    """Obtain the statistics of the current request, if recorded."""
+    if not has_app_context():
+        return None
+
+    return g.get('query_stats')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Take the start time of a statement."""
+    if _current_stats() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    """Record an executed statement in the statistics of the request."""
+    stats = _current_stats()
+    started = conn.info.get('query_start')
+
+    if stats is None or not started:
+        return
+
+    stats.record(statement, time.perf_counter() - started.pop())
+
+
+class QueryStats(object):
+    """Record the statements executed in each request.
+
+    Args:
+        app (Flask): Application instance.
+    """
+    def __init__(self, app=None):
+        self.enabled = False
+        self.headers = False
+        self.slow_time = 0.5
+        self.strict = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configure the instrumentation from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.enabled = app.config.get('QUERY_STATS_ENABLED', True)
+        self.headers = app.config.get('QUERY_STATS_HEADERS', False)
+        self.slow_time = app.config.get('QUERY_STATS_SLOW_TIME', 0.5)
+        self.strict = app.config.get('QUERY_BUDGET_STRICT', False)
+
+        if not self.enabled:
+            return
+
+        # Listen on every engine (engines are created lazily)
+        for name, listener in (
+                ('before_cursor_execute', _before_cursor_execute),
+                ('after_cursor_execute', _after_cursor_execute)):
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def current(self):
+        """Obtain the statistics of the current request.
+
+        Returns:
+            `RequestStats` instance, or `None` if not recorded.
+        """
+        return _current_stats()
+
+    def check_budget(self, count, budget):
+        """Check the number of statements issued by the current view.
+
+        Args:
+            count (int): Statements issued by the view.
+            budget (int): Statements allowed.
+
+        Raises:
+            QueryBudgetExceeded: The budget was exceeded (strict mode only).
+        """
+        if count <= budget:
+            return
+
+        if self.strict:
+            raise QueryBudgetExceeded(request.endpoint, count, budget)
+
+        logger.warning(
+            '%s issued %d statements (budget: %d)',
+            request.endpoint,
+            count,
+            budget
+        )
+
+    def before_request(self):
+        """Start recording the statements of the request."""
+        g.query_stats = RequestStats()
+
+    def after_request(self, response):
+        """Log the statements of the request (and add the headers)."""
+        stats = _current_stats()
+
+        if stats is None:
+            return response
+
+        if self.headers:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time'] = '%.3f' % (stats.time * 1000)
+
+        if stats.count:
+            logger.debug(
+                '%s %s: %d statements in %.1f ms (slowest: %.1f ms)',
+                request.method,
+                request.path,
+                stats.count,
+                stats.time * 1000,
+                stats.slowest_time * 1000
+            )
+
+        if stats.slowest is not None and stats.slowest_time >= self.slow_time:
+            logger.warning(
+                'Slow statement in %s %s (%.1f ms): %s',
+                request.method,
+                request.path,
+                stats.slowest_time * 1000,
+                stats.slowest
+            )
+
+        return response
@@ -27,7 +27,7 @@
 
 """Mails."""
 
-from flask_babel import lazy_gettext as t
+from loc.helper.i18n import message as t
 
 
 # Welcome
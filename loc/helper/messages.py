@@ -27,7 +27,7 @@
 
 """Status messages."""
 
-from flask_babel import lazy_gettext as t
+from loc.helper.i18n import message as t
 
 
 
@@ -88,3 +88,5 @@ PASSWORD_NO_MATCH = t('Password does not match')
 OP_NOT_PERMITTED = t('Operation not permitted')
 INVALID_TOKEN = t('Token was not found or has expired')
 PAGE_INVALID = t('Not a valid page number')
+SERVER_BUSY = t('The server is busy, try again later')
+TOO_MANY_REQUESTS = t('Too many requests, try again later')
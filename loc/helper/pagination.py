@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Pagination of queries.
+
+Lists can be paginated by page number (`LIMIT/OFFSET`, which gets slower
+with deeper pages) or by cursor (keyset pagination): the cursor holds the
+values of the ordering columns of the first or last record of a page, and
+the next page is obtained with a range condition on those columns, so every
+page costs the same.
+
+Records are not counted to paginate: one more record than needed is read to
+know if there is a next page. Totals are only obtained when requested (see
+`loc.helper.util.query_total()`).
+
+Cursors are opaque to clients (URL-safe base64 encoded JSON).
+"""
+
+from sqlalchemy import and_, or_
+
+import base64
+import datetime
+import json
+import math
+import operator
+
+
+# Format of dates in cursors
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class Page(object):
+    """Page of a list.
+
+    Attributes:
+        items (list): Rows of the page. When paginated by a `Keyset`, the
+            values of the ordering columns are the last elements of each row.
+        per_page (int): Number of records per page.
+        page (int): Page number (`None` if paginated by cursor).
+        has_next (bool): Whether there are more records after this page.
+        cursors (bool): Whether the list can be paginated by cursor.
+        next (str): Cursor of the next page (`None` in the last page).
+        prev (str): Cursor of the previous page (`None` in the first page).
+        total (int): Total number of records, only set if requested.
+    """
+    __slots__ = (
+        'items', 'per_page', 'page', 'has_next', 'cursors', 'next', 'prev',
+        'total'
+    )
+
+    def __init__(self, items, per_page, page=None, has_next=False,
+                 cursors=False, next=None, prev=None):
+        self.items = items
+        self.per_page = per_page
+        self.page = page
+        self.has_next = has_next
+        self.cursors = cursors
+        self.next = next
+        self.prev = prev
+        self.total = None
+
+    def as_dict(self, items):
+        """Generate the structure for a paginated response.
+
+        Args:
+            items (list): List of items to return.
+        """
+        response = {'list': items}
+
+        if self.page is not None:
+            response['page'] = self.page
+            response['has-next'] = self.has_next
+
+        if self.cursors:
+            response['next'] = self.next
+            response['prev'] = self.prev
+
+        if self.total is not None:
+            response['total'] = self.total
+            response['pages'] = int(math.ceil(self.total / self.per_page))
+
+        return response
+
+
+def paginate(query, page, per_page):
+    """Obtain a page of a query by number, without counting the records.
+
+    Args:
+        query (Query): Query of the records, sorted.
+        page (int): Page number (starting at 1).
+        per_page (int): Number of records per page.
+
+    Returns:
+        `Page` instance.
+    """
+    page = max(page, 1)
+
+    items = query.limit(per_page + 1).offset((page - 1) * per_page).all()
+
+    return Page(items[:per_page], per_page, page, len(items) > per_page)
+
+
+class Keyset(object):
+    """Ordering of a list, used to paginate it by page or by cursor.
+
+    The columns are sorted in ascending order and, together, must be unique
+    (e.g. ending with the primary key). An index on the columns allows
+    walking any page with a range scan.
+
+    Cursors cannot hold `NULL` values (and databases do not agree on where
+    they are sorted), so records with `NULL` in a nullable column of the
+    ordering are left out of the list (see `filter()`).
+
+    Args:
+        columns: Columns of the ordering.
+    """
+    __slots__ = ('columns', '_types', '_not_null')
+
+    def __init__(self, *columns):
+        self.columns = columns
+        self._types = tuple(c.type.python_type for c in columns)
+        self._not_null = tuple(c.isnot(None) for c in columns if c.nullable)
+
+    def filter(self, query):
+        """Skip the records that cannot be listed with the ordering.
+
+        Must also be applied to the queries used to count the records.
+        """
+        if self._not_null:
+            query = query.filter(*self._not_null)
+
+        return query
+
+    def order(self, query):
+        """Sort a query by the columns of the ordering."""
+        return self.filter(query).order_by(*self.columns)
+
+    def paginate(self, query, page, cursor, per_page):
+        """Obtain a page of a query.
+
+        The ordering columns are added to the query (so rows are tuples) and
+        it is sorted by them.
+
+        Args:
+            query (Query): Query of the records, without ordering.
+            page (int): Page number, used if `cursor` is `None`.
+            cursor (str): Cursor received (empty for the first page).
+            per_page (int): Number of records per page.
+
+        Returns:
+            `Page` instance.
+
+        Raises:
+            ValueError: The cursor is not valid.
+        """
+        query = self.filter(query.add_columns(*self.columns))
+
+        if cursor is None:
+            return self._by_number(query, page, per_page)
+
+        if not cursor:
+            return self._after(query, None, per_page)
+
+        direction, values = self.decode(cursor)
+
+        if direction == 'next':
+            return self._after(query, values, per_page)
+
+        return self._before(query, values, per_page)
+
+    def _by_number(self, query, page, per_page):
+        """Page by number (`LIMIT/OFFSET`)."""
+        result = paginate(query.order_by(*self.columns), page, per_page)
+        items = result.items
+
+        result.cursors = True
+
+        if result.has_next:
+            result.next = self._cursor('next', items[-1])
+
+        if result.page > 1 and items:
+            result.prev = self._cursor('prev', items[0])
+
+        return result
+
+    def _after(self, query, values, per_page):
+        """Page following a record (or first page)."""
+        if values is not None:
+            query = query.filter(self._condition(values, operator.gt))
+
+        items = query.order_by(*self.columns).limit(per_page + 1).all()
+        has_next = len(items) > per_page
+        items = items[:per_page]
+
+        return Page(
+            items,
+            per_page,
+            cursors=True,
+            next=self._cursor('next', items[-1]) if has_next else None,
+            prev=self._cursor('prev', items[0]) if values and items else None
+        )
+
+    def _before(self, query, values, per_page):
+        """Page preceding a record."""
+        items = (
+            query
+            .filter(self._condition(values, operator.lt))
+            .order_by(*[c.desc() for c in self.columns])
+            .limit(per_page + 1)
+            .all()
+        )
+        has_prev = len(items) > per_page
+        items = items[:per_page][::-1]
+
+        return Page(
+            items,
+            per_page,
+            cursors=True,
+            next=self._cursor('next', items[-1]) if items else None,
+            prev=self._cursor('prev', items[0]) if has_prev else None
+        )
+
+    def _condition(self, values, op):
+        """Range condition for the records after/before the given values.
+
+        The condition on the first column alone is included so that the
+        database can use a range scan on the index.
+        """
+        condition = op(self.columns[-1], values[-1])
+
+        for column, value in zip(self.columns[-2::-1], values[-2::-1]):
+            condition = or_(
+                op(column, value),
+                and_(column == value, condition)
+            )
+
+        first_op = operator.ge if op is operator.gt else operator.le
+
+        return and_(first_op(self.columns[0], values[0]), condition)
+
+    def _cursor(self, direction, row):
+        """Encode the cursor of a row."""
+        values = row[-len(self.columns):]
+
+        return self.encode(direction, values)
+
+    def encode(self, direction, values):
+        """Encode a cursor.
+
+        Args:
+            direction (str): `next` or `prev`.
+            values (tuple): Values of the ordering columns.
+        """
+        values = [
+            v.strftime(CURSOR_DATE_FORMAT)
+            if isinstance(v, datetime.datetime) else v
+            for v in values
+        ]
+
+        data = json.dumps([direction] + values, separators=(',', ':'))
+
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Decode a cursor.
+
+        Returns:
+            Tuple with the direction and the values of the ordering columns.
+
+        Raises:
+            ValueError: The cursor is not valid.
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+
+        except (TypeError, ValueError, UnicodeError):
+            raise ValueError(cursor)
+
+        if (not isinstance(data, list)
+                or len(data) != len(self.columns) + 1
+                or data[0] not in ('next', 'prev')):
+            raise ValueError(cursor)
+
+        values = []
+
+        for value, p_type in zip(data[1:], self._types):
+            if p_type is datetime.datetime:
+                if not isinstance(value, str):
+                    raise ValueError(cursor)
+
+                value = datetime.datetime.strptime(value, CURSOR_DATE_FORMAT)
+
+            elif not isinstance(value, p_type) or isinstance(value, bool):
+                raise ValueError(cursor)
+
+            values.append(value)
+
+        return data[0], values
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Token bucket rate limiting.
+
+Used to protect expensive endpoints (bcrypt, mails) from bursts of requests.
+Each limit is a bucket of `capacity` tokens that refills completely in
+`period` seconds, and every request consumes a token.
+
+The following backends are available (`RATELIMIT_BACKEND` setting):
+    memory: buckets are kept in the current process.
+    redis: buckets are shared by all the workers (`RATELIMIT_URL` setting).
+        Requires the `redis` package.
+"""
+
+from threading import Lock
+
+from loc.helper.cache import LRUCache
+
+import logging
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(object):
+    """Buckets stored in the current process.
+
+    Args:
+        maxsize (int): Maximum number of buckets to keep. Least recently used
+            buckets are discarded first.
+    """
+    def __init__(self, maxsize=100000):
+        self._buckets = LRUCache(maxsize)
+        self._lock = Lock()
+
+    def consume(self, key, capacity, period):
+        """Consume a token from a bucket.
+
+        Args:
+            key (str): Bucket identifier.
+            capacity (int): Maximum number of tokens in the bucket.
+            period (float): Seconds needed to refill the bucket.
+
+        Returns:
+            Tuple `(allowed, retry_after)`, where `retry_after` is the number
+            of seconds until a token is available.
+        """
+        rate = capacity / period
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            # The bucket is full again after `period` seconds
+            self._buckets.set(key, (tokens, now), ttl=period)
+
+        if allowed:
+            return True, 0
+
+        return False, (1 - tokens) / rate
+
+
+class RedisBackend(object):
+    """Buckets stored in Redis and shared by all the workers.
+
+    Args:
+        url (str): Redis server URL.
+        prefix (str): Prefix for the keys of the buckets.
+    """
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local period = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local rate = capacity / period
+
+        local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local ts = tonumber(bucket[2]) or now
+
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+
+        redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(period))
+
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='loc:ratelimit:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for this backend')
+
+        self.prefix = prefix
+        self._client = redis.StrictRedis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, period):
+        """Consume a token from a bucket.
+
+        See `MemoryBackend.consume()`.
+        """
+        allowed, tokens = self._script(
+            keys=[self.prefix + key],
+            args=[capacity, period, time.time()]
+        )
+
+        if allowed:
+            return True, 0
+
+        return False, (1 - float(tokens)) * period / capacity
+
+
+class RateLimiter(object):
+    """Applies the rate limits defined in the application settings.
+
+    Limits are defined in the `RATELIMITS` setting as a dictionary mapping
+    the name of the limit to a `(capacity, period)` tuple. Rate limiting can
+    be disabled with the `RATELIMIT_ENABLED` setting.
+
+    Args:
+        app (Flask): Application instance.
+    """
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.limits = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Create the backend from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+        """
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        self.limits = app.config.get('RATELIMITS', {})
+
+        backend = app.config.get('RATELIMIT_BACKEND', 'memory')
+
+        if backend == 'memory':
+            self.backend = MemoryBackend()
+
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['RATELIMIT_URL'])
+
+        else:
+            raise ValueError('Unknown rate limit backend: %s' % backend)
+
+    def hit(self, name, value):
+        """Register a request.
+
+        Args:
+            name (str): Name of the limit in the `RATELIMITS` setting.
+            value (str): Value the request is keyed by (IP, username...).
+
+        Returns:
+            `None` if the request is allowed, otherwise the number of seconds
+            until it would be allowed.
+        """
+        if not self.enabled or name not in self.limits:
+            return None
+
+        capacity, period = self.limits[name]
+
+        try:
+            allowed, retry_after = self.backend.consume(
+                '%s:%s' % (name, value),
+                capacity,
+                period
+            )
+
+        except Exception as e:
+            # Do not block the service if the backend is not available
+            logger.warning('Could not apply the %s rate limit: %s', name, e)
+            return None
+
+        return None if allowed else retry_after
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Broadcast of JWT token revocations between workers.
+
+Every worker keeps its own token cache (see `loc.helper.cache.TokenCache`),
+so when the JWT counter of a user is incremented the rest of the workers must
+be notified. Revocations are published as `(user_id, new_counter)` pairs in a
+channel that every worker polls periodically. Changes that do not revoke
+tokens but make the cached ones stale (e.g. new roles) are published with
+`EVICT` as the counter, which evicts the tokens without revoking them.
+
+The following backends are available (`REVOCATION_BACKEND` setting):
+    memory: only notifies the current process (development and testing).
+    file: append-only file shared by all the workers of a host
+        (`REVOCATION_FILE` setting).
+    redis: Redis stream shared by all the hosts (`REVOCATION_URL` setting).
+        Requires the `redis` package.
+
+New processes only apply revocations published after they start, except
+with stateless access tokens (`JWT_STATELESS` setting): these tokens are
+never checked against the database, so the revocations of the last
+`JWT_ACCESS_EXPIRATION` seconds are replayed when the channel is created.
+"""
+
+from threading import Lock
+
+import logging
+import os
+import time
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Counter published to evict the cached tokens of a user without revoking them
+EVICT = -1
+
+
+class RevocationChannel(object):
+    """Base class for revocation channels."""
+
+    def publish(self, user_id, counter):
+        """Publish a revocation.
+
+        Args:
+            user_id (int): ID of the user whose tokens were invalidated.
+            counter (int): New value of the JWT counter of the user.
+        """
+        raise NotImplementedError
+
+    def poll(self):
+        """Obtain the revocations published since the last poll.
+
+        Returns:
+            list of `(user_id, counter)` tuples.
+        """
+        raise NotImplementedError
+
+
+class MemoryChannel(RevocationChannel):
+    """Channel that only lives in the current process."""
+
+    def __init__(self):
+        self._pending = []
+        self._lock = Lock()
+
+    def publish(self, user_id, counter):
+        with self._lock:
+            self._pending.append((user_id, counter))
+
+    def poll(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        return pending
+
+
+class FileChannel(RevocationChannel):
+    """Channel backed by an append-only file.
+
+    Each revocation is written as a `<user_id> <counter> <timestamp>` line.
+    Lines are short enough for appends to be atomic, so no locking is needed
+    between processes.
+
+    Args:
+        path (str): Path of the file (created if it does not exist).
+        replay (int): Seconds of past revocations to apply on the first poll.
+    """
+    def __init__(self, path, replay=0):
+        self.path = path
+        self._lock = Lock()
+        self._since = 0
+
+        if replay > 0:
+            # Read from the start, skipping stale revocations
+            self._since = time.time() - replay
+            self._offset = 0
+
+        else:
+            # Older revocations are not relevant for a new process
+            with open(self.path, 'ab') as f:
+                self._offset = f.tell()
+
+    def publish(self, user_id, counter):
+        line = ('%d %d %d\n' % (user_id, counter, time.time())).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+        try:
+            os.write(fd, line)
+
+        finally:
+            os.close(fd)
+
+    def poll(self):
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    f.seek(0, os.SEEK_END)
+
+                    # File was truncated/rotated
+                    if f.tell() < self._offset:
+                        self._offset = 0
+
+                    f.seek(self._offset)
+                    data = f.read()
+
+            except FileNotFoundError:
+                self._offset = 0
+                return []
+
+            # Ignore incomplete lines until the next poll
+            end = data.rfind(b'\n') + 1
+            self._offset += end
+
+        revocations = []
+        for line in data[:end].splitlines():
+            try:
+                # Lines written by older versions have no timestamp
+                user_id, counter, *published = line.split()
+
+                if published and float(published[0]) < self._since:
+                    continue
+
+                revocations.append((int(user_id), int(counter)))
+
+            except ValueError:
+                # TODO log
+                continue
+
+        return revocations
+
+
+class RedisChannel(RevocationChannel):
+    """Channel backed by a capped Redis stream.
+
+    Only plain stream commands (`XADD`, `XREAD` and `XREVRANGE`) are used, so
+    any server implementing the Redis protocol can be used.
+
+    Args:
+        url (str): Redis server URL.
+        key (str): Key of the stream.
+        maxlen (int): Approximate number of revocations to keep in the stream.
+        replay (int): Seconds of past revocations to apply on the first poll.
+            Otherwise, the first poll only looks up the last entry of the
+            stream (so the server is not needed to create the channel).
+    """
+    def __init__(self, url, key='loc:revocations', maxlen=10000, replay=0):
+        if redis is None:
+            raise RuntimeError('The redis package is required for this backend')
+
+        self.key = key
+        self.maxlen = maxlen
+        self._client = redis.StrictRedis.from_url(url)
+        self._lock = Lock()
+
+        if replay > 0:
+            # Entry IDs start with the time they were added (milliseconds)
+            since = int((time.time() - replay) * 1000)
+            self._last_id = ('%d-0' % max(since, 0)).encode()
+
+        else:
+            self._last_id = None
+
+    def publish(self, user_id, counter):
+        self._client.xadd(
+            self.key,
+            {'user': user_id, 'counter': counter},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+
+    def poll(self):
+        with self._lock:
+            if self._last_id is None:
+                # Older revocations are not relevant for a new process (its
+                # cache is empty)
+                last = self._client.xrevrange(self.key, count=1)
+                self._last_id = last[0][0] if last else b'0-0'
+                return []
+
+            result = self._client.xread({self.key: self._last_id})
+
+            revocations = []
+            for _, entries in result:
+                for entry_id, fields in entries:
+                    self._last_id = entry_id
+                    revocations.append(
+                        (int(fields[b'user']), int(fields[b'counter']))
+                    )
+
+        return revocations
+
+
+class Revocations(object):
+    """Publishes revocations and applies those of other workers to the cache.
+
+    Configured through the `REVOCATION_BACKEND`, `REVOCATION_FILE`,
+    `REVOCATION_URL` and `REVOCATION_POLL_INTERVAL` settings. The latter is the
+    maximum time (in seconds) a worker may keep serving a revoked token.
+
+    Args:
+        app (Flask): Application instance.
+        cache (TokenCache): Token cache of the worker.
+    """
+    def __init__(self, app=None, cache=None):
+        self.channel = None
+        self.cache = cache
+        self.interval = 0
+
+        self._next_poll = 0
+        self._failing = False
+        self._lock = Lock()
+
+        if app is not None:
+            self.init_app(app, cache)
+
+    def init_app(self, app, cache):
+        """Create the channel from the application settings.
+
+        Args:
+            app (Flask): Application instance.
+            cache (TokenCache): Token cache of the worker.
+        """
+        self.cache = cache
+        self.interval = app.config.get('REVOCATION_POLL_INTERVAL', 1)
+
+        backend = app.config.get('REVOCATION_BACKEND', 'memory')
+
+        # Stateless access tokens issued before this process started may have
+        # been revoked already
+        replay = 0
+        if app.config.get('JWT_STATELESS'):
+            replay = app.config.get('JWT_ACCESS_EXPIRATION', 0)
+
+        if backend == 'memory':
+            self.channel = MemoryChannel()
+
+        elif backend == 'file':
+            self.channel = FileChannel(app.config['REVOCATION_FILE'], replay)
+
+        elif backend == 'redis':
+            self.channel = RedisChannel(
+                app.config['REVOCATION_URL'],
+                replay=replay
+            )
+
+        else:
+            raise ValueError('Unknown revocation backend: %s' % backend)
+
+    def publish(self, user_id, counter=None):
+        """Publish a revocation to all the workers.
+
+        Args:
+            user_id (int): ID of the user whose tokens were invalidated.
+            counter (int): Optional. New value of the JWT counter of the user.
+                If not specified, the cached tokens of the user are evicted
+                but not revoked.
+        """
+        self.channel.publish(user_id, EVICT if counter is None else counter)
+
+    def sync(self):
+        """Evict the cached tokens revoked by any worker.
+
+        The channel is only polled once every `REVOCATION_POLL_INTERVAL`
+        seconds. If it cannot be polled, the whole cache is discarded instead
+        (until the channel works again).
+        """
+        now = time.monotonic()
+
+        if now < self._next_poll or not self._lock.acquire(False):
+            return
+
+        try:
+            self._next_poll = now + self.interval
+
+            for user_id, counter in self.channel.poll():
+                self.cache.evict_user(
+                    user_id,
+                    None if counter == EVICT else counter
+                )
+
+            if self._failing:
+                logger.info('Revocation channel is available again')
+                self._failing = False
+
+        except Exception:
+            # Only log the first failure of an outage
+            if not self._failing:
+                logger.exception('Could not poll the revocation channel')
+                self._failing = True
+
+            # Revocations may have been missed, so nothing cached is trusted
+            self.cache.clear()
+
+        finally:
+            self._lock.release()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Declarative request schemas.
+
+Schemas are declared next to each endpoint and compiled once (at import time)
+into a list of validators, so every request is checked, converted and filled
+with defaults in a single pass over the declared parameters. See
+`loc.helper.deco.with_params()`.
+"""
+
+from loc.helper import messages as m, util
+
+import datetime
+
+
+# Format of date parameters
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Marker for parameters without default value (required)
+MISSING = object()
+
+
+class Param(object):
+    """Declaration of a request parameter.
+
+    Args:
+        name (str): Name of the parameter in the request.
+        p_type (type): Expected data type. `datetime.datetime` parameters are
+            received as strings in `DATE_FORMAT` and converted.
+        default: Optional. Value used when the parameter is not received. If
+            not specified, the parameter is required.
+        choices (tuple): Optional. Values accepted for the parameter (or for
+            each of its items, for lists).
+    """
+    __slots__ = ('name', 'attr', 'p_type', 'default', 'choices')
+
+    def __init__(self, name, p_type, default=MISSING, choices=None):
+        self.name = name
+        self.attr = name.replace('-', '_')
+        self.p_type = p_type
+        self.default = default
+        self.choices = choices
+
+    @property
+    def required(self):
+        return self.default is MISSING
+
+
+def _type_validator(p_type):
+    """Create the validator for a basic data type.
+
+    Validators receive the value and whether it comes from the query string,
+    and return `(value, error)`.
+    """
+    def validate(value, from_query):
+        if from_query:
+            try:
+                value = util.parse_query_value(value, p_type)
+
+            except ValueError:
+                return None, m.INVALID_TYPE
+
+        if not isinstance(value, p_type):
+            return None, m.INVALID_TYPE
+
+        return value, None
+
+    return validate
+
+def _choices_validator(validator, choices, many=False):
+    """Wrap a validator to only accept the specified values.
+
+    If `many` is `True`, values are lists and each item is checked.
+    """
+    choices = frozenset(choices)
+
+    def validate(value, from_query):
+        value, error = validator(value, from_query)
+
+        if error is not None:
+            return value, error
+
+        if many:
+            valid = all(
+                isinstance(v, str) and v in choices for v in value
+            )
+
+        else:
+            valid = value in choices
+
+        if not valid:
+            return None, m.INVALID_VALUE
+
+        return value, None
+
+    return validate
+
+def _date_validator(fmt):
+    """Create the validator for a date parameter."""
+    def validate(value, from_query):
+        if not isinstance(value, str):
+            return None, m.INVALID_TYPE
+
+        try:
+            return datetime.datetime.strptime(value, fmt), None
+
+        except ValueError:
+            return None, m.INVALID_VALUE
+
+    return validate
+
+
+class Schema(object):
+    """Compiled set of request parameters.
+
+    Validated parameters are returned as an instance of a class generated for
+    the schema, with an attribute for each parameter (dashes in the names are
+    replaced by underscores).
+
+    Args:
+        params (list[Param]): Parameters of the request.
+    """
+    def __init__(self, params):
+        self.params = tuple(params)
+
+        attrs = tuple(p.attr for p in self.params)
+        self.result_class = type('Params', (object,), {'__slots__': attrs})
+
+        self._validators = []
+        for p in self.params:
+            if p.p_type is datetime.datetime:
+                validator = _date_validator(DATE_FORMAT)
+
+            else:
+                validator = _type_validator(p.p_type)
+
+            if p.choices is not None:
+                validator = _choices_validator(
+                    validator,
+                    p.choices,
+                    p.p_type is list
+                )
+
+            self._validators.append(
+                (p.name, p.attr, p.required, p.default, validator)
+            )
+
+    def validate(self, received, query_params=()):
+        """Validate the parameters of a request.
+
+        Args:
+            received (dict): Parameters received.
+            query_params (set): Names of the parameters received in the query
+                string (as strings).
+
+        Returns:
+            Tuple `(params, errors)`. `params` is `None` if there were errors,
+            which are specified in the `errors` dict.
+        """
+        result = self.result_class()
+        errors = {}
+
+        for name, attr, required, default, validator in self._validators:
+            if name not in received:
+                if required:
+                    errors[name] = m.FIELD_MISSING
+
+                else:
+                    setattr(result, attr, default)
+
+                continue
+
+            value, error = validator(received[name], name in query_params)
+
+            if error is not None:
+                errors[name] = error
+
+            else:
+                setattr(result, attr, value)
+
+        if errors:
+            return None, errors
+
+        return result, None
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# League of Code server implementation
+# https://github.com/guluc3m/loc-server
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Grupo de Usuarios de Linux UC3M <http://gul.es>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""Serializers of records shown in responses.
+
+Serializers are compiled once (per model and set of fields, or per view) and
+convert records to the dicts sent in responses. Lists are read as row tuples
+with only the columns needed (see `Serializer.query()`), instead of loading
+full ORM instances, and each row is converted with a single `zip()`.
+
+Dates are left as `datetime` objects, they are encoded by the response
+encoder.
+"""
+
+from functools import lru_cache
+
+import operator
+
+
+class Serializer(object):
+    """Serializer of records with a fixed set of fields.
+
+    Args:
+        fields (list[tuple]): List of tuples containing the name of the field
+            in responses and the column attribute (e.g. `Match.title`).
+        hidden (tuple): Optional. Columns selected in queries but not
+            serialized (a query needs at least one column).
+    """
+    __slots__ = ('names', 'columns', 'attrs', '_getter')
+
+    def __init__(self, fields, hidden=()):
+        self.names = tuple(name for name, column in fields)
+        self.attrs = tuple(column.key for name, column in fields)
+        self.columns = tuple(column for name, column in fields) + hidden
+
+        if not self.attrs:
+            self._getter = lambda obj: ()
+
+        elif len(self.attrs) == 1:
+            # attrgetter() does not return a tuple for a single attribute
+            getter = operator.attrgetter(self.attrs[0])
+            self._getter = lambda obj: (getter(obj),)
+
+        else:
+            self._getter = operator.attrgetter(*self.attrs)
+
+    def query(self, query, *columns):
+        """Select the columns of the serializer in a query.
+
+        Rows of the resulting query are tuples with the values of the fields
+        (and hidden columns) followed by any extra `columns`.
+
+        Args:
+            query (Query): Query of the records.
+            columns: Optional. Extra columns to select.
+        """
+        return query.with_entities(*(self.columns + columns))
+
+    def rows(self, rows):
+        """Serialize rows selected with `query()`.
+
+        Returns:
+            List of dicts.
+        """
+        names = self.names
+
+        return [dict(zip(names, row)) for row in rows]
+
+    def row(self, row):
+        """Serialize a row selected with `query()`."""
+        return dict(zip(self.names, row))
+
+    def object(self, obj):
+        """Serialize an object (e.g. an ORM instance)."""
+        return dict(zip(self.names, self._getter(obj)))
+
+
+@lru_cache(maxsize=256)
+def _model_serializer(model, fields):
+    """Compile the serializer of a model (fields must be normalized)."""
+    hidden = () if fields else (model.__mapper__.primary_key[0],)
+
+    return Serializer(
+        [(name, getattr(model, model._fields[name])) for name in fields],
+        hidden
+    )
+
+def for_model(model, fields):
+    """Obtain the serializer of some of the public fields of a model.
+
+    Serializers are compiled on first use and reused. Fields are sent in
+    the order of the `_fields` of the model, once.
+
+    Args:
+        model (Model): Model with public fields (see
+            `loc.models.PublicFieldsMixin`).
+        fields (list[str]): Names of the fields in responses.
+    """
+    return _model_serializer(model, model._normalize_fields(fields))
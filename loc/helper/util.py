@@ -2,15 +2,30 @@
 
 """Utility functions."""
 
-from flask import jsonify, current_app
-from loc import db
+from flask import current_app, g, request, stream_with_context
+from flask_babel.speaklater import LazyString
+from loc import bcrypt_executor, count_cache, db, json_encoder
 from loc.helper import messages as m
-from loc.models import User
+from loc.helper.pagination import Keyset
+from loc.models import Match, Party
 
 import datetime
+import itertools
+import json
 import random
-import bcrypt
-import jwt
+
+
+# Formats of streamed responses
+STREAM_FORMATS = ('json', 'ndjson')
+
+# Ordering of match lists
+MATCH_ORDER = Keyset(Match.start_date, Match.id)
+
+# Ordering of leaderboards
+LEADERBOARD_ORDER = Keyset(Party.position, Party.owner_id)
+
+# Ordering of other party lists (participants, LFG)
+PARTY_ORDER = Keyset(Party.owner_id)
 
 
 def api_error(message='', **kwargs):
@@ -33,7 +48,9 @@ def api_error(message='', **kwargs):
     if kwargs:
         response['data'] = kwargs
 
-    return jsonify(**response)
+    key = None if kwargs else _constant_key('error', message=message)
+
+    return json_encoder.response(response, key)
 
 def api_fail(*args, **kwargs):
     """Generate a failure JSON response.
@@ -49,7 +66,111 @@ def api_fail(*args, **kwargs):
         'data': list(args) or kwargs or None
     }
 
-    return jsonify(**response)
+    key = None if args else _constant_key('fail', **kwargs)
+
+    return json_encoder.response(response, key)
+
+def approximate_count(query):
+    """Estimate the number of records of a query.
+
+    The estimate is obtained from the plan of the query in PostgreSQL and
+    MySQL, which is cheap but may be inaccurate (it depends on the statistics
+    of the tables). Other databases count the records.
+
+    Args:
+        query (Query): Query of the records.
+    """
+    query = query.order_by(None)
+    connection = db.session.connection()
+    dialect = connection.dialect
+
+    if dialect.name not in ('postgresql', 'mysql'):
+        return query.count()
+
+    compiled = query.statement.compile(dialect=dialect)
+
+    if compiled.positional:
+        params = tuple(compiled.params[p] for p in compiled.positiontup)
+
+    else:
+        params = compiled.params
+
+    if dialect.name == 'postgresql':
+        plan = connection.execute(
+            'EXPLAIN (FORMAT JSON) ' + str(compiled),
+            params
+        ).scalar()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    row = connection.execute('EXPLAIN ' + str(compiled), params).first()
+    filtered = row['filtered'] if 'filtered' in row.keys() else 100
+
+    return int(row['rows'] * filtered / 100)
+
+def api_stream(query, serialize, fmt='json'):
+    """Generate a streamed response with all the records of a query.
+
+    Records are fetched in batches of `STREAM_BATCH_SIZE` (using
+    `Query.yield_per()`) and serialized as they are sent in a chunked
+    response, so memory usage does not depend on the number of records.
+
+    Args:
+        query (Query): Query of the records (or any iterable).
+        serialize (callable): Function that receives a list of records and
+            returns the list of items to send.
+        fmt (str): `json` to send a success JSend response with the items in
+            `data.list`, or `ndjson` to send an item per line.
+    """
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+
+    if hasattr(query, 'yield_per'):
+        query = query.yield_per(batch_size)
+
+    rows = iter(query)
+
+    def generate():
+        first = True
+
+        if fmt == 'json':
+            yield b'{"status":"success","data":{"list":['
+
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+
+            if not batch:
+                break
+
+            items = [json_encoder.dumps(i) for i in serialize(batch)]
+
+            if not items:
+                continue
+
+            if fmt == 'ndjson':
+                yield b'\n'.join(items) + b'\n'
+
+            else:
+                chunk = b','.join(items)
+                yield chunk if first else b',' + chunk
+
+            first = False
+
+        if fmt == 'json':
+            yield b']}}'
+
+    if fmt == 'ndjson':
+        mimetype = 'application/x-ndjson'
+
+    else:
+        mimetype = 'application/json'
+
+    return current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=mimetype
+    )
 
 def api_success(*args, **kwargs):
     """Generate a success JSON response.
@@ -64,7 +185,51 @@ def api_success(*args, **kwargs):
         'data': list(args) or kwargs or None
     }
 
-    return jsonify(**response)
+    key = None if args or kwargs else _constant_key('success')
+
+    return json_encoder.response(response, key)
+
+def client_address():
+    """Obtain the IP address of the client of the current request.
+
+    Behind reverse proxies (`TRUSTED_PROXIES` setting, number of proxies in
+    front of the server), the address is the one added to the
+    `X-Forwarded-For` header by the outermost trusted proxy, since previous
+    entries can be set by the client.
+
+    Returns:
+        IP address (str).
+    """
+    proxies = current_app.config.get('TRUSTED_PROXIES', 0)
+
+    if proxies > 0:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        addresses = [a.strip() for a in forwarded.split(',') if a.strip()]
+
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+
+    return request.remote_addr
+
+def _constant_key(status, **messages):
+    """Obtain the key of a response containing only translated messages.
+
+    Args:
+        status (str): JSend status of the response.
+
+    Returns:
+        Key including the resolved messages (so that it depends on the
+        language), or `None` if the response contains other values.
+    """
+    key = [status]
+
+    for name, value in sorted(messages.items()):
+        if not isinstance(value, LazyString):
+            return None
+
+        key.append((name, str(value)))
+
+    return tuple(key)
 
 def generate_expiration_date(**kwargs):
     """Generate an expiration date starting on current UTC datetime.
@@ -90,7 +255,7 @@ def generate_token(length=64):
 def hash_matches(password, hashed):
     """Check a password against a hash.
 
-    Uses bcrypt algorithm.
+    Uses bcrypt algorithm, run in the bcrypt executor.
 
     Args:
         password (str): Original password.
@@ -98,28 +263,104 @@ def hash_matches(password, hashed):
 
     Returns:
         `True` or `False`
+
+    Raises:
+        BcryptBusy: The bcrypt queue is full.
     """
     # Bcrypt works with bytes
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return bcrypt_executor.checkpw(password.encode(), hashed.encode())
+
+def hash_needs_update(hashed):
+    """Check if a hash was generated with a different number of rounds.
+
+    Args:
+        hashed (str): Hashed password.
+
+    Returns:
+        `True` if the password should be hashed again with the configured
+        `BCRYPT_ROUNDS`.
+    """
+    return hash_rounds(hashed) != current_app.config.get('BCRYPT_ROUNDS', 12)
 
 def hash_password(password):
     """Hash the provided password.
 
-    Uses bcrypt algorithm.
+    Uses bcrypt algorithm, run in the bcrypt executor.
 
     Args:
         password (str): Plaintext password.
 
     Returns:
         Hashed password.
+
+    Raises:
+        BcryptBusy: The bcrypt queue is full.
     """
     # Bcrypt works with bytes
     rounds = current_app.config.get('BCRYPT_ROUNDS', 12)
 
-    return bcrypt.hashpw(
-        password.encode(),
-        bcrypt.gensalt(rounds=rounds)
-    ).decode()
+    return bcrypt_executor.hashpw(password.encode(), rounds).decode()
+
+def hash_rounds(hashed):
+    """Obtain the number of rounds (cost) used to generate a bcrypt hash.
+
+    Args:
+        hashed (str): Hashed password, in the `$2b$<rounds>$<salt+hash>`
+            format.
+
+    Returns:
+        Number of rounds, or `None` if the hash is not valid.
+    """
+    try:
+        return int(hashed.split('$')[2])
+
+    except (IndexError, ValueError):
+        return None
+
+def leaderboard_page(match_id, page, cursor, per_page):
+    """Obtain a page of the leaderboard of a match.
+
+    The parties and their members are obtained in a single query (see
+    `Party._leaderboard()`) or, if the database cannot aggregate them, in
+    two queries (see `party_items()`).
+
+    Args:
+        match_id (int): ID of the match.
+        page (int): Page number, used if `cursor` is `None`.
+        cursor (str): Cursor received (empty for the first page).
+        per_page (int): Number of parties per page.
+
+    Returns:
+        Tuple with the `Page` and the list of items of the page.
+
+    Raises:
+        ValueError: The cursor is not valid.
+    """
+    query = Party._leaderboard(match_id)
+
+    if query is None:
+        query = Party.query.filter_by(match_id=match_id, is_participating=True)
+        parties = LEADERBOARD_ORDER.paginate(query, page, cursor, per_page)
+
+        return parties, party_items(
+            match_id,
+            [row[0] for row in parties.items],
+            True
+        )
+
+    parties = LEADERBOARD_ORDER.paginate(query, page, cursor, per_page)
+    items = []
+
+    for row in parties.items:
+        members = row[2]
+
+        items.append({
+            'leader': row[1] or '',
+            'position': row[0],
+            'members': members.split(Party.MEMBER_SEPARATOR) if members else []
+        })
+
+    return parties, items
 
 def list_chunks(items, n):
     """Divide a list in n-sized chunks.
@@ -136,20 +377,118 @@ def list_chunks(items, n):
     for i in range(0, len(items), n):
         yield items[i:i+n]
 
-def paginated(page, pages, items):
+def paginated(page, items):
     """Generates the structure for a paginated response.
 
+    Used for lists known without querying them (e.g. empty lists).
+
     Args:
         page (int): Current page number.
-        pages (int): Total pages.
         items (list): List of items to return.
     """
     return {
         'page': page,
-        'pages': pages,
+        'has-next': False,
         'list': items
     }
 
+def party_items(match_id, parties, with_position=False, with_token=False):
+    """Generate the items of a list of parties of a match.
+
+    The members of all the parties are obtained in a single query, which
+    also provides the username of the leaders.
+
+    Args:
+        match_id (int): ID of the match.
+        parties (list[Party]): Parties to include.
+        with_position (bool): Include the position of the parties.
+        with_token (bool): Include the token to join the parties.
+
+    Returns:
+        List of dicts with the leader and members of each party.
+    """
+    rosters = Party._rosters(match_id, [p.owner_id for p in parties])
+    items = []
+
+    for party in parties:
+        item = {'leader': ''}
+
+        if with_position:
+            item['position'] = party.position
+
+        if with_token:
+            item['party-token'] = party.token
+
+        item['members'] = []
+
+        for user_id, username in rosters[party.owner_id]:
+            if user_id == party.owner_id:
+                item['leader'] = username
+
+            item['members'].append(username)
+
+        items.append(item)
+
+    return items
+
+def parse_query_value(value, p_type):
+    """Convert a query string value to the expected data type.
+
+    Args:
+        value (str): Value received in the query string.
+        p_type (type): Expected data type.
+
+    Returns:
+        Converted value.
+
+    Raises:
+        ValueError: The value cannot be converted.
+    """
+    if p_type is str:
+        return value
+
+    if p_type is bool:
+        if value.lower() in ('true', '1'):
+            return True
+
+        if value.lower() in ('false', '0'):
+            return False
+
+        raise ValueError(value)
+
+    if p_type is list:
+        return value.split(',') if value else []
+
+    return p_type(value)
+
+def query_total(query, tag, name, approximate=False):
+    """Obtain the total number of records of a list.
+
+    Totals are kept in the count cache, and must be invalidated (by tag)
+    after writes that change them.
+
+    Args:
+        query (Query): Query of the records.
+        tag: Tag of the list in the count cache (e.g. `'matches'` or
+            `('match', <id>)`).
+        name (str): Name of the list within the tag.
+        approximate (bool): Estimate the total instead of counting the
+            records (see `approximate_count()`).
+    """
+    key = (tag, name, approximate)
+    total = count_cache.get(key)
+
+    if total is None:
+        if approximate:
+            total = approximate_count(query)
+
+        else:
+            total = query.order_by(None).count()
+
+        count_cache.set(key, total)
+
+    return total
+
 def record_exists(model, **kwargs):
     """Check if a record exists using a simple filter.
 
@@ -165,25 +504,47 @@ def record_exists(model, **kwargs):
         .exists()
     ).scalar()
 
-def user_from_jwt(token):
-    """Obtain user record from JWT token.
+def request_params():
+    """Obtain the parameters of the current request.
 
-    Args:
-        token (str): Encoded JWT token.
+    Parameters are read from the JSON body and, for GET requests, also from
+    the query string (so that reads can be cached by HTTP caches). Values in
+    the JSON body take precedence.
+
+    Values from the query string are strings: they are converted to the
+    expected type by the `with_params()` decorator.
 
     Returns:
-        `User` record if it exists, otherwise `None`.
+        dict with the parameters (shared during the request).
     """
-    # Decode
-    try:
-        decoded = jwt.decode(token, current_app.config['SECRET_KEY'])
+    if 'params' not in g:
+        received = request.get_json(silent=True)
+        params = dict(received) if isinstance(received, dict) else {}
 
-    except jwt.ExpiredSignatureError:
-        #TODO log
-        return None
+        g.query_params = set()
+
+        if request.method in ('GET', 'HEAD'):
+            for name, value in request.args.items():
+                if name not in params:
+                    params[name] = value
+                    g.query_params.add(name)
+
+        g.params = params
+
+    return g.params
+
+def request_token():
+    """Obtain the JWT token of the current request.
+
+    The token is read from the `Authorization: Bearer <token>` header or, for
+    backwards compatibility, from the `token` parameter.
+
+    Returns:
+        Encoded token or `None` if not found.
+    """
+    header = request.headers.get('Authorization', '')
+
+    if header[:7].lower() == 'bearer ':
+        return header[7:].strip() or None
 
-    # Get user
-    return User.query.filter_by(
-        id=decoded.get('sub', -1),
-        is_deleted=False
-    ).first()
+    return request_params().get('token')
@@ -28,10 +28,129 @@
 """Model definition."""
 
 from loc import db
+from loc.helper import serializers
+from sqlalchemy import and_, bindparam, case, event, func
+from sqlalchemy.ext import baked
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import load_only
+from sqlalchemy.sql.functions import FunctionElement
 import datetime
 
 
+# Caches of the compiled queries of frequent lookups (by primary key, slug,
+# username...), which only bind their parameters on each call. Lookups that
+# only load some columns have a query per set of fields requested by clients,
+# so they are kept apart (and there is room for every set) in order not to
+# evict the rest.
+bakery = baked.bakery()
+fields_bakery = baked.bakery(size=1024)
+
+def _lookup_query(model, columns=None):
+    """Start a baked lookup query of a model.
+
+    Args:
+        model (Model): Model to query.
+        columns (list[str]): Optional. Attributes to load (all by default),
+            which are part of the cache key of the query.
+
+    Returns:
+        `BakedQuery` instance.
+    """
+    if not columns:
+        return bakery(lambda session: session.query(model), model)
+
+    columns = tuple(columns)
+
+    return fields_bakery(
+        lambda session: session.query(model).options(load_only(*columns)),
+        model,
+        *columns
+    )
+
+
+class string_agg(FunctionElement):
+    """Concatenation of the (non-null) values of a group with a separator.
+
+    Compiled to `string_agg()` in PostgreSQL and `group_concat()` in MySQL
+    and SQLite. Other databases do not support it (see `DIALECTS`).
+    """
+    type = db.String()
+    name = 'string_agg'
+
+    # Databases supporting the aggregation
+    DIALECTS = ('postgresql', 'mysql', 'sqlite')
+
+@compiles(string_agg, 'postgresql')
+def _string_agg_postgresql(element, compiler, **kwargs):
+    """Compile `string_agg` for PostgreSQL."""
+    return 'string_agg(%s)' % compiler.process(element.clauses, **kwargs)
+
+@compiles(string_agg, 'mysql')
+def _string_agg_mysql(element, compiler, **kwargs):
+    """Compile `string_agg` for MySQL."""
+    value, separator = element.clauses
+    return 'group_concat(%s SEPARATOR %s)' % (
+        compiler.process(value, **kwargs),
+        compiler.process(separator, **kwargs)
+    )
+
+@compiles(string_agg, 'sqlite')
+def _string_agg_sqlite(element, compiler, **kwargs):
+    """Compile `string_agg` for SQLite."""
+    return 'group_concat(%s)' % compiler.process(element.clauses, **kwargs)
+
+
+class PublicFieldsMixin(object):
+    """Sparse fieldsets for models shown in responses.
+
+    Models define `_fields`, mapping the names of the fields in responses to
+    the attributes of the model, so that clients can request a subset of
+    them and only the corresponding columns are loaded (see
+    `loc.helper.serializers.for_model()`).
+    """
+    _fields = {}
+
+    @classmethod
+    def _normalize_fields(cls, fields):
+        """Sort a list of fields as in `_fields`, without repetitions.
+
+        Used to key compiled serializers and queries by the set of fields
+        requested, regardless of their order.
+
+        Args:
+            fields (list[str]): Names of the fields in responses.
+
+        Returns:
+            Tuple with the names of the fields.
+        """
+        fields = set(fields)
+
+        return tuple(f for f in cls._fields if f in fields)
+
+    @classmethod
+    def _columns(cls, fields):
+        """Obtain the attributes to load for a list of fields.
+
+        Intended for the `load_only()` loader option. The primary key is
+        always loaded.
+
+        Args:
+            fields (list[str]): Names of the fields in responses.
+        """
+        columns = [cls._fields[f] for f in cls._normalize_fields(fields)]
+
+        return columns or [cls.__mapper__.primary_key[0].key]
+
+    def fields_dict(self, fields):
+        """Get some of the public fields as a dictionary.
+
+        Args:
+            fields (list[str]): Names of the fields in responses.
+        """
+        return serializers.for_model(type(self), fields).object(self)
+
+
 class Follower(db.Model):
     """User followers.
 
@@ -55,7 +174,7 @@ class Follower(db.Model):
     follow_date = db.Column(db.DateTime, default=datetime.datetime.utcnow())
 
 
-class Match(db.Model):
+class Match(PublicFieldsMixin, db.Model):
     """Development matches.
 
     Attributes:
@@ -75,14 +194,40 @@ class Match(db.Model):
         is_visible (bool): Whether this match should be shown publicly.
         is_deleted (bool): Whether the record has been (soft) deleted.
         delete_date (date): Date in which the record was (soft) deleted.
+
+    The long description is deferred: it is only loaded when accessed or
+    when the query undefers it.
     """
     __tablename__ = 'matches'
+    __table_args__ = (
+        # Ordering of match lists (see `loc.helper.pagination.Keyset`)
+        db.Index('ix_matches_start_date_id', 'start_date', 'id'),
+    )
+
+    _fields = {
+        'id': 'id',
+        'title': 'title',
+        'short-description': 'short_description',
+        'long-description': 'long_description',
+        'start-date': 'start_date',
+        'end-date': 'end_date',
+        'min-members': 'min_members',
+        'max-members': 'max_members',
+        'slug': 'slug'
+    }
+
+    # Fields shown in lists by default
+    _list_fields = ('title', 'start-date', 'end-date', 'slug')
+
+    # Fields that can be requested in lists (the long description is only
+    # shown once the match has started, see `as_dict()`)
+    _list_choices = tuple(f for f in _fields if f != 'long-description')
 
     id = db.Column(db.Integer, primary_key=True)
 
     title = db.Column(db.String(255), nullable=False)
     short_description = db.Column(db.String(255), nullable=False)
-    long_description = db.Column(db.Text, nullable=False)
+    long_description = db.deferred(db.Column(db.Text, nullable=False))
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     min_members = db.Column(db.Integer, nullable=False, default=1)
@@ -102,58 +247,50 @@ class Match(db.Model):
     )
 
 
-    def as_dict(self, include_long=False):
+    def as_dict(self, include_long=False, fields=None):
         """Get record fields as a dictionary.
 
         This is an utility method for use when creating a response.
 
         Args:
             include_long (bool): Include the long description (should be done
-        o        only if the match has started).
+                only if the match has started).
+            fields (list[str]): Optional. Fields to include (all by default).
         Returns:
-            dict with all the public attributes.
+            dict with the public attributes.
         """
-        return {
-            'id': self.id,
-            'title': self.title,
-            'short-description': self.short_description,
-            'long-description': self.long_description if include_long else '',
-            'start-date': self.start_date.isoformat(),
-            'end-date': self.end_date.isoformat(),
-            'min-members': self.min_members,
-            'max-members': self.max_members,
-            'slug': self.slug
-        }
+        fields = self._fields if fields is None else fields
+
+        if not include_long and 'long-description' in fields:
+            response = self.fields_dict(
+                [f for f in fields if f != 'long-description']
+            )
+            response['long-description'] = ''
+
+            return response
+
+        return self.fields_dict(fields)
 
     @staticmethod
-    def _by_slug(slug, skip_deleted=True):
+    def _by_slug(slug, skip_deleted=True, columns=None):
         """Obtain a match by slug.
 
         Args:
             slug (str): Match slug to find.
             skip_deleted (bool): Whether to skip deleted users.
+            columns (list[str]): Optional. Attributes to load (see
+                `PublicFieldsMixin._columns()`).
         """
+        query = _lookup_query(Match, columns)
+        query += lambda q: q.filter(
+            Match.slug == bindparam('slug'),
+            Match.is_visible == True
+        )
+
         if skip_deleted:
-            query = (
-                Match
-                .query
-                .filter_by(
-                    slug=slug,
-                    is_visible=True,
-                    is_deleted=False
-                )
-            )
-        else:
-            query = (
-                Match
-                .query
-                .filter_by(
-                    slug=slug,
-                    is_visible=True,
-                )
-            )
+            query += lambda q: q.filter(Match.is_deleted == False)
 
-        return query.first()
+        return query(db.session()).params(slug=slug).first()
 
 
 class MatchParticipant(db.Model):
@@ -197,6 +334,18 @@ class Party(db.Model):
         position (int): Position in the match.
     """
     __tablename__ = 'parties'
+    __table_args__ = (
+        # Ordering of party lists (see `loc.helper.util`)
+        db.Index(
+            'ix_parties_leaderboard',
+            'match_id', 'is_participating', 'position', 'owner_id'
+        ),
+        db.Index(
+            'ix_parties_participants',
+            'match_id', 'is_participating', 'owner_id'
+        ),
+        db.Index('ix_parties_lfg', 'match_id', 'is_public', 'owner_id'),
+    )
 
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), primary_key=True)
@@ -222,6 +371,89 @@ class Party(db.Model):
         lazy='select'
     )
 
+    # Separator of the usernames aggregated in `_leaderboard()`
+    MEMBER_SEPARATOR = '\x1f'
+
+    @staticmethod
+    def _leaderboard(match_id):
+        """Query the leaderboard of a match with the members of each party.
+
+        Each row contains the position, the username of the leader and the
+        usernames of the members (joined with `MEMBER_SEPARATOR`, or `None`
+        if the party has no members) of a participating party, so a page is
+        obtained in a single query. Deleted users are skipped.
+
+        The query is not sorted.
+
+        Args:
+            match_id (int): ID of the match.
+
+        Returns:
+            Query, or `None` if the database does not support `string_agg`.
+        """
+        dialect = db.session.connection().dialect
+
+        if dialect.name not in string_agg.DIALECTS:
+            return None
+
+        return (
+            db.session
+            .query(
+                Party.position,
+                func.max(case([(User.id == Party.owner_id, User.username)])),
+                string_agg(User.username, Party.MEMBER_SEPARATOR)
+            )
+            .select_from(Party)
+            .outerjoin(MatchParticipant, and_(
+                MatchParticipant.party_owner_id == Party.owner_id,
+                MatchParticipant.match_id == Party.match_id
+            ))
+            .outerjoin(User, and_(
+                User.id == MatchParticipant.user_id,
+                User.is_deleted == False
+            ))
+            .filter(
+                Party.match_id == match_id,
+                Party.is_participating == True
+            )
+            .group_by(Party.match_id, Party.owner_id, Party.position)
+        )
+
+    @staticmethod
+    def _rosters(match_id, owner_ids):
+        """Obtain the members of several parties of a match in one query.
+
+        Deleted users are skipped.
+
+        Args:
+            match_id (int): ID of the match.
+            owner_ids (list[int]): IDs of the owners of the parties.
+
+        Returns:
+            dict with the list of `(user_id, username)` tuples of the members
+            of each party, by owner ID.
+        """
+        rosters = {owner_id: [] for owner_id in owner_ids}
+
+        if not rosters:
+            return rosters
+
+        members = (
+            db.session
+            .query(MatchParticipant.party_owner_id, User.id, User.username)
+            .join(User, User.id==MatchParticipant.user_id)
+            .filter(
+                MatchParticipant.match_id == match_id,
+                MatchParticipant.party_owner_id.in_(list(rosters)),
+                User.is_deleted == False
+            )
+        )
+
+        for owner_id, user_id, username in members:
+            rosters[owner_id].append((user_id, username))
+
+        return rosters
+
 
 class Role(db.Model):
     """Special roles used for some actions.
@@ -248,7 +480,10 @@ class Role(db.Model):
         Returns:
             `Role` instance or `None` if not found
         """
-        return cls.query.filter_by(name=name).first()
+        query = _lookup_query(Role)
+        query += lambda q: q.filter(Role.name == bindparam('name'))
+
+        return query(db.session()).params(name=name).first()
 
 
 class Submission(db.Model):
@@ -261,19 +496,22 @@ class Submission(db.Model):
         url (str): URL from which the project can be downloaded.
         match_id (int): ID of the match this submission belongs to.
         party_owner_id (int): ID of the owner of the submitting party.
+
+    The description is deferred: it is only loaded when accessed or when the
+    query undefers it.
     """
     __tablename__ = 'submissions'
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
-    description = db.Column(db.Text, nullable=False)
+    description = db.deferred(db.Column(db.Text, nullable=False))
     url = db.Column(db.String(512), nullable=False)
 
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'))
     party_owner_id = db.Column(db.Integer, db.ForeignKey('users.id'))
 
 
-class User(db.Model):
+class User(PublicFieldsMixin, db.Model):
     """Platform users.
 
     Attributes:
@@ -288,9 +526,16 @@ class User(db.Model):
         is_deleted (bool): Whether the record has been (soft) deleted.
         delete_date (date): Date in which the record was (soft) deleted.
         _jwt_counter (int): Counter to invalidate old tokens.
+        _roles_version (int): Counter incremented whenever the roles of the
+            user change, used to check the roles included in JWT tokens.
     """
     __tablename__ = 'users'
 
+    _fields = {
+        'username': 'username',
+        'name': 'name'
+    }
+
     id = db.Column(db.Integer, primary_key=True)
 
     username = db.Column(db.String(128), nullable=False, unique=True)
@@ -305,6 +550,7 @@ class User(db.Model):
     delete_date = db.Column(db.DateTime)
 
     _jwt_counter = db.Column(db.Integer, nullable=False, default=0)
+    _roles_version = db.Column(db.Integer, nullable=False, default=0)
 
     # Relationships
     following = db.relationship(
@@ -337,19 +583,38 @@ class User(db.Model):
     )
 
     @staticmethod
-    def _by_username(username, skip_deleted=True):
+    def _by_id(user_id, skip_deleted=True):
+        """Obtain a user by ID.
+
+        Args:
+            user_id (int): ID of the user to find.
+            skip_deleted (bool): Whether to skip deleted users.
+        """
+        query = _lookup_query(User)
+        query += lambda q: q.filter(User.id == bindparam('user_id'))
+
+        if skip_deleted:
+            query += lambda q: q.filter(User.is_deleted == False)
+
+        return query(db.session()).params(user_id=user_id).first()
+
+    @staticmethod
+    def _by_username(username, skip_deleted=True, columns=None):
         """Obtain a user by username.
 
         Args:
             username (str): Username to find.
             skip_deleted (bool): Whether to skip deleted users.
+            columns (list[str]): Optional. Attributes to load (see
+                `PublicFieldsMixin._columns()`).
         """
+        query = _lookup_query(User, columns)
+        query += lambda q: q.filter(User.username == bindparam('username'))
+
         if skip_deleted:
-            query = User.query.filter_by(username=username, is_deleted=False)
-        else:
-            query = User.query.filter_by(username=username)
+            query += lambda q: q.filter(User.is_deleted == False)
 
-        return query.first()
+        return query(db.session()).params(username=username).first()
 
     @staticmethod
     def _by_email(email, skip_deleted=True):
@@ -359,12 +624,25 @@ class User(db.Model):
             email (str): Email to find.
             skip_deleted (bool): Whether to skip deleted users.
         """
+        query = _lookup_query(User)
+        query += lambda q: q.filter(User.email == bindparam('email'))
+
         if skip_deleted:
-            query = User.query.filter_by(email=email, is_deleted=False)
-        else:
-            query = User.query.filter_by(email=email)
+            query += lambda q: q.filter(User.is_deleted == False)
+
+        return query(db.session()).params(email=email).first()
+
 
-        return query.first()
+@event.listens_for(User.roles, 'append')
+@event.listens_for(User.roles, 'remove')
+def _roles_changed(user, role, initiator):
+    """Increment the roles version of the user when the roles change.
+
+    The user is also recorded in the session, so that its cached tokens are
+    discarded once the change is committed (see `loc.helper.auth`).
+    """
+    user._roles_version = (user._roles_version or 0) + 1
+    db.session().info.setdefault('roles_changed', set()).add(user)
 
 
 class UserRole(db.Model):
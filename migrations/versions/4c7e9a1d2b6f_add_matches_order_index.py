@@ -0,0 +1,28 @@
+"""Add index on the ordering of match lists
+
+Revision ID: 4c7e9a1d2b6f
+Revises: 8a1f3c2b7d4e
+Create Date: 2026-10-17 16:20:08.417205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e9a1d2b6f'
+down_revision = '8a1f3c2b7d4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_matches_start_date_id',
+        'matches',
+        ['start_date', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_matches_start_date_id', table_name='matches')
@@ -0,0 +1,33 @@
+"""Add roles version to users
+
+Revision ID: 8a1f3c2b7d4e
+Revises: d3e96303cf6d
+Create Date: 2026-10-17 10:12:41.553028
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a1f3c2b7d4e'
+down_revision = 'd3e96303cf6d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'users',
+        sa.Column(
+            '_roles_version',
+            sa.Integer(),
+            nullable=False,
+            server_default='0'
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('_roles_version')
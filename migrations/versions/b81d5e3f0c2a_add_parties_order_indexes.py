@@ -0,0 +1,40 @@
+"""Add indexes on the ordering of party lists
+
+Revision ID: b81d5e3f0c2a
+Revises: 4c7e9a1d2b6f
+Create Date: 2026-10-17 18:02:37.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81d5e3f0c2a'
+down_revision = '4c7e9a1d2b6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_parties_leaderboard',
+        'parties',
+        ['match_id', 'is_participating', 'position', 'owner_id']
+    )
+    op.create_index(
+        'ix_parties_participants',
+        'parties',
+        ['match_id', 'is_participating', 'owner_id']
+    )
+    op.create_index(
+        'ix_parties_lfg',
+        'parties',
+        ['match_id', 'is_public', 'owner_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_parties_lfg', table_name='parties')
+    op.drop_index('ix_parties_participants', table_name='parties')
+    op.drop_index('ix_parties_leaderboard', table_name='parties')